@@ -0,0 +1 @@
+# KitabAI benchmarks - offline pipeline measurements against a local Google Books stand-in
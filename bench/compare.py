@@ -0,0 +1,54 @@
+# Compare two benchmark result files
+#
+#   python -m bench.compare baseline.json candidate.json --threshold 0.1
+
+import argparse
+import json
+import sys
+
+METRICS = ("p50_ms", "p90_ms", "p99_ms", "peak_mb")
+
+
+def load_results(path):
+    with open(path, encoding="utf-8") as fh:
+        report = json.load(fh)
+    return {(r["stage"], r["size"]): r for r in report["results"]}, report.get("meta", {})
+
+
+def compare(baseline, candidate, threshold):
+    rows, regressions = [], []
+    for key in sorted(baseline.keys() & candidate.keys()):
+        old, new = baseline[key], candidate[key]
+        for metric in METRICS:
+            if not old.get(metric):
+                continue
+            change = new[metric] / old[metric] - 1
+            rows.append((*key, metric, old[metric], new[metric], change))
+            if change > threshold:
+                regressions.append(rows[-1])
+    return rows, regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Flag regressions between two bench.run result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    parser.add_argument("--threshold", type=float, default=0.1, help="relative slowdown that counts as a regression")
+    args = parser.parse_args(argv)
+
+    baseline, old_meta = load_results(args.baseline)
+    candidate, new_meta = load_results(args.candidate)
+    rows, regressions = compare(baseline, candidate, args.threshold)
+
+    print(f"baseline {old_meta.get('commit')}  candidate {new_meta.get('commit')}")
+    print(f"{'stage':<10} {'size':>9} {'metric':<8} {'baseline':>11} {'candidate':>11} {'change':>8}")
+    for stage, size, metric, old, new, change in rows:
+        flag = "  !" if change > args.threshold else ""
+        print(f"{stage:<10} {size:>9} {metric:<8} {old:>11.3f} {new:>11.3f} {change:>+8.1%}{flag}")
+    if regressions:
+        print(f"{len(regressions)} metric(s) regressed by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
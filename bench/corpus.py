@@ -0,0 +1,97 @@
+# Synthetic Google Books corpora
+# Deterministic volumes in the API's response shape, drawn from a Zipf-distributed vocabulary so TF-IDF
+# sees realistic term statistics at any size from 1k to 1M
+
+import argparse
+import json
+
+import numpy as np
+
+SIZES = (1_000, 10_000, 100_000, 1_000_000)
+VOCABULARY_SIZE = 20_000
+DESCRIPTION_WORDS = 60
+CHUNK_SIZE = 10_000
+ZIPF_EXPONENT = 1.15
+SYLLABLES = ("ka", "ri", "to", "mel", "an", "dor", "si", "ven", "lu", "qar", "be", "nim", "os", "tha", "ul",
+             "zen", "pra", "gil", "mo", "ek", "fa", "dru", "ys", "hal")
+CATEGORIES = ("Fiction", "Science Fiction", "Mystery", "Romance", "Business & Economics", "Self-Help",
+              "History", "Biography & Autobiography", "Science", "Poetry", "Juvenile Fiction", "Philosophy")
+
+
+def vocabulary(size=VOCABULARY_SIZE, seed=0):
+    rng = np.random.default_rng(seed)
+    words, seen = [], set()
+    while len(words) < size:
+        n = rng.integers(2, 5)
+        word = "".join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), n))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    return words
+
+
+def _zipf_words(rng, n, vocab_size):
+    return np.minimum(rng.zipf(ZIPF_EXPONENT, n), vocab_size) - 1
+
+
+def generate_volumes(n, seed=0, vocab=None):
+    vocab = vocab or vocabulary(seed=seed)
+    n_authors = max(n // 20, 10)
+    for chunk_start in range(0, n, CHUNK_SIZE):
+        rng = np.random.default_rng([seed, chunk_start])
+        size = min(CHUNK_SIZE, n - chunk_start)
+        description_words = _zipf_words(rng, size * DESCRIPTION_WORDS, len(vocab)).reshape(size, -1)
+        title_lengths = rng.integers(1, 5, size)
+        title_words = _zipf_words(rng, size * 4, len(vocab)).reshape(size, 4)
+        authors = rng.integers(0, n_authors, (size, 2))
+        co_author = rng.random(size) < 0.15
+        categories = rng.integers(0, len(CATEGORIES), size)
+        ratings = np.round(rng.uniform(1, 5, size) * 2) / 2
+        has_rating = rng.random(size) < 0.6
+        pages = rng.integers(60, 1200, size)
+        has_pages = rng.random(size) < 0.75
+        years = rng.integers(1850, 2025, size)
+        has_thumbnail = rng.random(size) < 0.8
+
+        for i in range(size):
+            number = chunk_start + i
+            info = {
+                "title": " ".join(vocab[w] for w in title_words[i, :title_lengths[i]]).title() + f" {number}",
+                "authors": [f"Author {a}" for a in authors[i, :2 if co_author[i] else 1]],
+                "description": " ".join(vocab[w] for w in description_words[i]),
+                "categories": [CATEGORIES[categories[i]]],
+                "publishedDate": str(years[i]),
+            }
+            if has_rating[i]:
+                info["averageRating"] = float(ratings[i])
+            if has_pages[i]:
+                info["pageCount"] = int(pages[i])
+            if has_thumbnail[i]:
+                info["imageLinks"] = {"thumbnail": f"http://books.example/covers/{number}.jpg"}
+            yield {"kind": "books#volume", "id": f"syn{seed}-{number:07d}", "volumeInfo": info}
+
+
+def write_corpus(path, n, seed=0):
+    with open(path, "w", encoding="utf-8") as fh:
+        for item in generate_volumes(n, seed):
+            fh.write(json.dumps(item, separators=(",", ":")) + "\n")
+
+
+def load_corpus(path):
+    with open(path, encoding="utf-8") as fh:
+        for line in fh:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic Google Books corpus as JSONL")
+    parser.add_argument("size", type=int, help="number of volumes, e.g. 1000 or 1000000")
+    parser.add_argument("output", help="path of the JSONL file to write")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    write_corpus(args.output, args.size, args.seed)
+
+
+if __name__ == "__main__":
+    main()
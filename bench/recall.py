@@ -0,0 +1,107 @@
+# Recall of the dense LSA mode against exact sparse TF-IDF cosine
+# For each dimension, recall@k is the share of the exact TF-IDF top-k that the LSA top-k also finds,
+# reported next to the stored matrix size and per-query latency of both modes
+#
+#   python -m bench.recall --size 20000 --dims 128,192,256 --output recall.json
+
+import argparse
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+import scipy.sparse as sp
+
+from bench.corpus import generate_volumes
+from bench.run import git_commit
+from kitab.columnar import parse_volumes
+from kitab.vectorize import TfidfModel, build_text
+
+SIZE = 20_000
+DIMS = (128, 192, 256)
+QUERIES = 500
+TOP_K = 10
+
+
+def matrix_bytes(matrix):
+    if sp.issparse(matrix):
+        return int(matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes)
+    return int(matrix.nbytes)
+
+
+def neighbours(model, rows, k):
+    engine = model.similarity()
+    timings, found = [], []
+    for row in rows:
+        start = time.perf_counter()
+        idx, _ = engine.query([row], k)
+        timings.append(time.perf_counter() - start)
+        found.append(set(idx[0].tolist()))
+    return found, np.asarray(timings)
+
+
+def evaluate(mode, model, rows, k, truth=None):
+    found, timings = neighbours(model, rows, k)
+    p50, p99 = np.percentile(timings, [50, 99])
+    result = {
+        "mode": mode,
+        "dim": int(model.matrix.shape[1]),
+        "matrix_mb": round(matrix_bytes(model.similarity().matrix) / 2 ** 20, 3),
+        "query_p50_ms": float(p50 * 1e3),
+        "query_p99_ms": float(p99 * 1e3),
+        "recall": 1.0,
+    }
+    if truth is not None:
+        hits = sum(len(a & b) for a, b in zip(truth, found))
+        result["recall"] = hits / max(1, sum(len(t) for t in truth))
+    return result, found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare LSA recall@k against exact TF-IDF cosine")
+    parser.add_argument("--size", type=int, default=SIZE)
+    parser.add_argument("--dims", default=",".join(map(str, DIMS)), help="comma-separated LSA dimensions")
+    parser.add_argument("--queries", type=int, default=QUERIES)
+    parser.add_argument("-k", type=int, default=TOP_K)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    df = parse_volumes(generate_volumes(args.size, args.seed))
+    ids = df["id"].astype(str).tolist()
+    texts = build_text(df).tolist()
+    rows = np.random.default_rng(args.seed).choice(len(ids), min(args.queries, len(ids)), replace=False)
+
+    exact, truth = evaluate("tfidf", TfidfModel("tfidf").fit(ids, texts), rows, args.k)
+    results = [exact]
+    for dim in (int(d) for d in args.dims.split(",") if d):
+        start = time.perf_counter()
+        model = TfidfModel("lsa", dim=dim).fit(ids, texts)
+        result, _ = evaluate("lsa", model, rows, args.k, truth)
+        result["fit_s"] = round(time.perf_counter() - start, 3)
+        results.append(result)
+
+    print(f"{'mode':<6} {'dim':>6} {'recall':>8} {'matrix MB':>10} {'p50 ms':>8} {'p99 ms':>8}", file=sys.stderr)
+    for r in results:
+        print(f"{r['mode']:<6} {r['dim']:>6} {r['recall']:>8.3f} {r['matrix_mb']:>10.1f} {r['query_p50_ms']:>8.3f} "
+              f"{r['query_p99_ms']:>8.3f}", file=sys.stderr)
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+# Pipeline benchmarks
+# Runs fetch -> parse -> vectorize -> match -> recommend -> rerank -> render against synthetic corpora and a local
+# stand-in server, reporting per-stage latency percentiles, throughput and peak traced memory as JSON
+#
+#   python -m bench.run --sizes 1000,10000,100000 --output results.json
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from bench.corpus import generate_volumes
+from bench.server import StandInServer
+from kitab import fetch
+from kitab.columnar import parse_volumes
+from kitab.render import PAGE_SIZE, card_html
+from kitab.rerank import CANDIDATES as RERANK_CANDIDATES, rerank
+from kitab.titles import TitleIndex
+from kitab.vectorize import TfidfModel, build_text
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+REPEATS = 5
+QUERIES = 200
+TOP_K = 10
+FETCH_TOTAL = 400
+
+
+def summarize(stage, size, samples, items_per_sample, peak_bytes):
+    samples = np.asarray(samples, dtype=np.float64)
+    p50, p90, p99 = np.percentile(samples, [50, 90, 99])
+    return {
+        "stage": stage,
+        "size": size,
+        "samples": int(len(samples)),
+        "items_per_sample": items_per_sample,
+        "mean_ms": float(samples.mean() * 1e3),
+        "p50_ms": float(p50 * 1e3),
+        "p90_ms": float(p90 * 1e3),
+        "p99_ms": float(p99 * 1e3),
+        "max_ms": float(samples.max() * 1e3),
+        "throughput_per_s": float(items_per_sample / p50) if p50 > 0 else None,
+        "peak_mb": round(peak_bytes / 2 ** 20, 3),
+    }
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def traced_peak(fn):
+    # Memory is traced in a separate pass so tracemalloc overhead never skews the latency samples
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def run_stage(stage, size, fn, repeats, items_per_sample, trace=True):
+    fn()
+    samples = [timed(fn)[0] for _ in range(repeats)]
+    peak = traced_peak(fn) if trace else 0
+    return summarize(stage, size, samples, items_per_sample, peak)
+
+
+def run_per_query(stage, size, fn, queries, trace=True, items_per_sample=1):
+    fn(queries[0])
+    samples = [timed(fn, q)[0] for q in queries]
+    peak = traced_peak(lambda: [fn(q) for q in queries[:10]]) if trace else 0
+    return summarize(stage, size, samples, items_per_sample, peak)
+
+
+def bench_fetch(server, repeats, total, trace):
+    # The local rate limit guards the real API quota; against the stand-in it would only time the token bucket
+    fetch.configure(rate=1e6, burst=10 ** 6)
+    session = fetch.make_session()
+    counter = iter(range(10 ** 9))
+
+    def fetch_once():
+        # A fresh query every call keeps the run cold, matching an uncached recommendation corpus
+        return fetch.fetch_books_paged(f"bench query {next(counter)}", total=total, session=session, url=server.url)
+
+    return run_stage("fetch", total, fetch_once, repeats, total, trace)
+
+
+def bench_size(size, repeats, n_queries, seed, trace):
+    items = list(generate_volumes(size, seed))
+    results = [run_stage("parse", size, lambda: parse_volumes(items), repeats, size, trace)]
+    df = parse_volumes(items)
+    del items
+
+    ids = df["id"].astype(str).tolist()
+    results.append(run_stage("vectorize", size, lambda: TfidfModel().fit(ids, build_text(df)), repeats, size,
+                             trace))
+    model = TfidfModel().fit(ids, build_text(df))
+    engine = model.similarity()
+
+    rng = np.random.default_rng(seed)
+    rows = rng.integers(0, size, n_queries)
+    titles = df["title"].tolist()
+    index = TitleIndex(ids, titles)
+    # Drop one character so matching exercises the fuzzy path rather than an exact hit
+    queries = [titles[r][:-2] + titles[r][-1] for r in rows]
+    results.append(run_per_query("match", size, index.best_match, queries, trace))
+    results.append(run_per_query("recommend", size, lambda row: engine.query([row], TOP_K), rows.tolist(), trace))
+
+    def rerank_once(row):
+        # Candidate metadata and vectors are gathered inside the sample, as the engine does per request
+        idx, scores = engine.query([row], RERANK_CANDIDATES)
+        return rerank(scores[0], engine.matrix[idx[0]], df.iloc[idx[0]], TOP_K, seeds=df.iloc[[row]])
+
+    results.append(run_per_query("rerank", size, rerank_once, rows.tolist(), trace,
+                                 items_per_sample=RERANK_CANDIDATES))
+
+    pages = [df.iloc[start:start + PAGE_SIZE] for start in range(0, min(size, PAGE_SIZE * n_queries), PAGE_SIZE)]
+    results.append(run_per_query("render", size, card_html, pages, trace, items_per_sample=PAGE_SIZE))
+    return results
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_table(results, out=sys.stderr):
+    print(f"{'stage':<10} {'size':>9} {'p50 ms':>10} {'p90 ms':>10} {'p99 ms':>10} {'items/s':>12} {'peak MB':>9}",
+          file=out)
+    for r in results:
+        throughput = f"{r['throughput_per_s']:.0f}" if r["throughput_per_s"] else "-"
+        print(f"{r['stage']:<10} {r['size']:>9} {r['p50_ms']:>10.3f} {r['p90_ms']:>10.3f} {r['p99_ms']:>10.3f} "
+              f"{throughput:>12} {r['peak_mb']:>9.1f}", file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the KitabAI pipeline offline")
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        help="comma-separated corpus sizes, up to 1000000")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--queries", type=int, default=QUERIES, help="per-query samples for match/recommend/render")
+    parser.add_argument("--fetch-total", type=int, default=FETCH_TOTAL, help="volumes per paginated fetch")
+    parser.add_argument("--latency", type=float, default=0.0, help="simulated API latency in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="write JSON results here instead of stdout")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    trace = not args.no_memory
+    with StandInServer(latency=args.latency) as server:
+        results = [bench_fetch(server, args.repeats, args.fetch_total, trace)]
+    for size in sizes:
+        results.extend(bench_size(size, args.repeats, args.queries, args.seed, trace))
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": vars(args),
+        },
+        "results": results,
+    }
+    print_table(results)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as fh:
+            fh.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
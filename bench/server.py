@@ -0,0 +1,133 @@
+# Local Google Books stand-in
+# Serves /books/v1/volumes from recorded responses or a synthetic corpus, so fetch benchmarks run offline
+
+import argparse
+import json
+import os
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from bench.corpus import generate_volumes
+from kitab.cache import normalize_query
+
+VOLUMES_PATH = "/books/v1/volumes"
+MAX_RESULTS = 40
+CORPUS_SIZE = 10_000
+
+
+def load_recordings(directory):
+    # Each recording is a saved API response; the query is the "query" field or the file name
+    recordings = {}
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as fh:
+                response = json.load(fh)
+            query = response.pop("query", name[:-len(".json")])
+            recordings[normalize_query(query)] = response.get("items", [])
+    return recordings
+
+
+class VolumesHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path != VOLUMES_PATH:
+            self._send(404, {"error": {"code": 404, "message": "Not Found"}})
+            return
+        params = parse_qs(url.query)
+        query = params.get("q", [""])[0]
+        if not query:
+            self._send(400, {"error": {"code": 400, "message": "Missing query."}})
+            return
+        start = int(params.get("startIndex", ["0"])[0])
+        count = min(int(params.get("maxResults", ["10"])[0]), MAX_RESULTS)
+
+        server = self.server
+        items = server.recordings.get(normalize_query(query))
+        if items is not None:
+            page, total = items[start:start + count], len(items)
+        else:
+            # Different queries see different, stable windows of the synthetic corpus
+            corpus, total = server.corpus, len(server.corpus)
+            offset = zlib.crc32(normalize_query(query).encode("utf-8")) % total
+            page = [corpus[(offset + i) % total] for i in range(start, min(start + count, total))]
+        if server.latency:
+            time.sleep(server.latency)
+        server.requests += 1
+        body = {"kind": "books#volumes", "totalItems": total}
+        if page:
+            body["items"] = page
+        self._send(200, body)
+
+    def _send(self, status, body):
+        data = json.dumps(body, separators=(",", ":")).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=UTF-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StandInServer:
+    def __init__(self, corpus=None, recordings=None, host="127.0.0.1", port=0, latency=0.0):
+        self.httpd = ThreadingHTTPServer((host, port), VolumesHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.corpus = corpus if corpus is not None else list(generate_volumes(CORPUS_SIZE))
+        self.httpd.recordings = recordings or {}
+        self.httpd.latency = latency
+        self.httpd.requests = 0
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}{VOLUMES_PATH}"
+
+    @property
+    def requests(self):
+        return self.httpd.requests
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="kitab-bench-server", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve a local Google Books stand-in")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--size", type=int, default=CORPUS_SIZE, help="synthetic corpus size")
+    parser.add_argument("--recordings", help="directory of recorded volumes responses (*.json)")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args(argv)
+
+    recordings = load_recordings(args.recordings) if args.recordings else None
+    server = StandInServer(list(generate_volumes(args.size)), recordings, port=args.port, latency=args.latency)
+    print(f"Serving {args.size} volumes at {server.url}")
+    try:
+        server.httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,64 @@
 # Professional Streamlit Book Recommendation System
 # With Custom CSS Styling & Professional UI/UX
 
+import hmac
+import os
+
 import streamlit as st
-import requests
 import pandas as pd
 import numpy as np
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.neighbors import NearestNeighbors
-from difflib import get_close_matches
 from datetime import datetime
 
+from kitab import ann, fetch, metrics
+from kitab.engine import Engine
+from kitab.feeds import CategoryFeeds
+from kitab.likes import LikedBooks, LikesStore, guest_user, new_guest_token
+from kitab.render import THUMBNAIL_WIDTH, CardCache, page_count, page_slice
+from kitab.shared import SessionSizes
+from kitab.thumbs import ThumbnailCache
+
 # ---------------------------------
 # CONFIG
 # ---------------------------------
-GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
+GOOGLE_BOOKS_URL = os.environ.get("KITAB_BOOKS_URL", fetch.GOOGLE_BOOKS_URL)
+DATA_DIR = os.environ.get("KITAB_DATA_DIR", ".kitab")
+CACHE_TTL_SECONDS = int(os.environ.get("KITAB_CACHE_TTL", 6 * 3600))
+CACHE_STALE_SECONDS = int(os.environ.get("KITAB_CACHE_STALE_TTL", 24 * 3600))
+API_MAX_CONCURRENT = int(os.environ.get("KITAB_API_CONCURRENCY", fetch.MAX_CONCURRENT))
+API_RATE_PER_SECOND = float(os.environ.get("KITAB_API_RATE", fetch.RATE_PER_SECOND))
+API_BURST = int(os.environ.get("KITAB_API_BURST", fetch.BURST))
+CACHE_MAX_ENTRIES = 5000
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+RECOMMENDATION_CORPUS_SIZE = 400
+LOCAL_MIN_RESULTS = int(os.environ.get("KITAB_LOCAL_MIN_RESULTS", 8))
+VECTORIZER_MODE = os.environ.get("KITAB_VECTORIZER", "tfidf")
+LSA_DIM = int(os.environ.get("KITAB_LSA_DIM", 192))
+ANN_MIN_DOCS = int(os.environ.get("KITAB_ANN_MIN_DOCS", 20000))
+ANN_PROBES = int(os.environ.get("KITAB_ANN_PROBES", ann.N_PROBE))
+SHARED_MAX_ENTRIES = 256
+SHARED_MAX_BYTES = int(os.environ.get("KITAB_SHARED_MAX_MB", 256)) * 1024 * 1024
+SHARED_MAX_MODELS = 16
+SHARED_MAX_MODEL_BYTES = int(os.environ.get("KITAB_MODELS_MAX_MB", 512)) * 1024 * 1024
+BOOK_TABLE_MAX_BYTES = int(os.environ.get("KITAB_BOOK_TABLE_MAX_MB", 64)) * 1024 * 1024
+CATEGORY_FEED_SIZE = 10
+CATEGORY_REFRESH_SECONDS = int(os.environ.get("KITAB_CATEGORY_REFRESH", 3600))
+THUMBNAIL_MAX_BYTES = int(os.environ.get("KITAB_THUMBNAIL_MAX_MB", 128)) * 1024 * 1024
+THUMBNAIL_WORKERS = 8
+CARD_CACHE_MAX_BYTES = int(os.environ.get("KITAB_CARD_CACHE_MAX_MB", 64)) * 1024 * 1024
+ADMIN_TOKEN = os.environ.get("KITAB_ADMIN_TOKEN", "")
+GUEST_SECRET = os.environ.get("KITAB_GUEST_SECRET", "")
+METRICS_PORT = int(os.environ.get("KITAB_METRICS_PORT", 0))
+
+categories = {
+    "Fiction": "fiction",
+    "Science Fiction": "science fiction",
+    "Mystery": "mystery thriller",
+    "Romance": "romance",
+    "Business": "business",
+    "Self-Help": "self-help",
+    "History": "history",
+    "Biography": "biography",
+}
 
 
 # ---------------------------------
@@ -241,93 +286,138 @@ inject_custom_css()
 # Functions
 # ---------------------------------
 
-def fetch_books(query: str, max_results: int = 40):
-    params = {"q": query, "maxResults": max_results}
-    try:
-        res = requests.get(GOOGLE_BOOKS_URL, params=params, timeout=10)
-        if res.status_code == 200:
-            data = res.json()
-            return data.get("items", [])
-        return []
-    except:
-        return []
-
-
-def extract_book_info(items):
-    books = []
-    for item in items:
-        info = item.get("volumeInfo", {})
-        books.append({
-            "id": item.get("id"),
-            "title": info.get("title", "No Title"),
-            "authors": ", ".join(info.get("authors", [])),
-            "description": info.get("description", ""),
-            "categories": ", ".join(info.get("categories", [])),
-            "thumbnail": info.get("imageLinks", {}).get("thumbnail", ""),
-            "published_date": info.get("publishedDate", "N/A"),
-            "page_count": info.get("pageCount", "N/A"),
-            "rating": info.get("averageRating", "N/A")
-        })
-    return pd.DataFrame(books)
-
-
-def best_title_match(title, df):
-    matches = get_close_matches(title, df["title"].tolist(), n=1, cutoff=0.4)
-    if matches:
-        return df[df["title"] == matches[0]].index[0]
-    return None
-
-
-def build_tfidf(df):
-    df["text"] = (
-            df["title"].fillna("") + " " +
-            df["authors"].fillna("") + " " +
-            df["description"].fillna("") + " " +
-            df["categories"].fillna("")
-    )
-    tfidf = TfidfVectorizer(stop_words="english", max_features=5000)
-    matrix = tfidf.fit_transform(df["text"])
-    return matrix
-
-
-def recommend(df, tfidf_matrix, book_index, top_k):
-    nn = NearestNeighbors(n_neighbors=min(top_k + 1, len(df)), metric="cosine").fit(tfidf_matrix)
-    distances, indices = nn.kneighbors(tfidf_matrix[book_index])
-    return indices[0][1:]
-
-
-def display_book_card(book, key_prefix=""):
-    with st.container():
-        st.markdown(f'<div class="book-card">', unsafe_allow_html=True)
-
-        col1, col2 = st.columns([1, 3])
-
-        with col1:
-            if book["thumbnail"]:
-                st.image(book["thumbnail"], width=140, use_container_width=False)
-            else:
-                st.markdown('<div style="background: #333; width: 140px; height: 200px; border-radius: 8px;"></div>',
-                            unsafe_allow_html=True)
+@st.cache_resource
+def get_metrics_server():
+    # Prometheus scrape endpoint at http://127.0.0.1:<KITAB_METRICS_PORT>/metrics, off unless configured
+    return metrics.serve(METRICS_PORT) if METRICS_PORT else None
+
+
+@st.cache_resource
+def get_engine():
+    # One engine per server process: its caches, catalog and fitted models are shared by every session
+    fetch.configure(max_concurrent=API_MAX_CONCURRENT, rate=API_RATE_PER_SECOND, burst=API_BURST)
+    return Engine(DATA_DIR, url=GOOGLE_BOOKS_URL, cache_ttl=CACHE_TTL_SECONDS, cache_stale_ttl=CACHE_STALE_SECONDS,
+                  cache_max_entries=CACHE_MAX_ENTRIES, cache_max_bytes=CACHE_MAX_BYTES,
+                  corpus_size=RECOMMENDATION_CORPUS_SIZE,
+                  vectorizer_mode=VECTORIZER_MODE, max_models=SHARED_MAX_MODELS,
+                  shared_max_entries=SHARED_MAX_ENTRIES, shared_max_bytes=SHARED_MAX_BYTES,
+                  ann_min_docs=ANN_MIN_DOCS, ann_probes=ANN_PROBES, lsa_dim=LSA_DIM,
+                  max_model_bytes=SHARED_MAX_MODEL_BYTES, book_table_max_bytes=BOOK_TABLE_MAX_BYTES)
+
 
-        with col2:
-            st.markdown(f'<h3 style="margin-top: 0;">{book["title"]}</h3>', unsafe_allow_html=True)
+def get_catalog():
+    return get_engine().catalog
 
-            st.markdown(f'<span class="badge">📖 {book["authors"]}</span>', unsafe_allow_html=True)
 
-            if book["rating"] != "N/A":
-                st.markdown(f'<span class="badge">⭐ {book["rating"]}/5</span>', unsafe_allow_html=True)
+@st.cache_resource
+def get_category_feeds():
+    engine = get_engine()
 
-            st.markdown(
-                f'<p style="color: #B0B8C1; font-size: 0.9rem;">{book["published_date"]} • Pages: {book["page_count"]}</p>',
-                unsafe_allow_html=True)
+    def load(query):
+        # Through the response cache, so a retry after a partial failure does not refetch what already arrived
+        return engine.extract_book_info(engine.fetch_books(query, CATEGORY_FEED_SIZE))
 
-            st.markdown(f'<p style="color: #B0B8C1; line-height: 1.6;">{book["description"][:280]}...</p>',
-                        unsafe_allow_html=True)
+    def warm(query, df):
+        # Browsing a category makes it the recommendation corpus, so its model is fitted ahead of the click
+        engine.model_for_frame(engine.corpus(query))
 
-            st.markdown(f'<p><span class="badge" style="background: #06D6A0;">{book["categories"]}</span></p>',
-                        unsafe_allow_html=True)
+    return CategoryFeeds(categories, load, interval=CATEGORY_REFRESH_SECONDS, warm=warm).start()
 
-        st.markdown('</div>', unsafe_allow_html=True)
+
+@st.cache_resource
+def get_likes_store():
+    return LikesStore(os.path.join(DATA_DIR, "likes.sqlite3"), get_engine().books)
+
+
+@st.cache_resource
+def get_session_sizes():
+    sizes = SessionSizes()
+    metrics.register_stats("session_state", sizes.stats)
+    return sizes
+
+
+def is_admin():
+    token = st.query_params.get("admin", "")
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def current_user():
+    # A signed-in identity selects a stored collection; without one, a guest token signed with KITAB_GUEST_SECRET
+    # does, if the deployment opted in. A token that does not verify is replaced, never used
+    try:
+        if st.user.is_logged_in:
+            return st.user.get("email")
+    except Exception:
+        pass
+    if not GUEST_SECRET:
+        return None
+    user = guest_user(GUEST_SECRET, st.query_params.get("guest"))
+    if user is None:
+        token = new_guest_token(GUEST_SECRET)
+        # Kept in the page URL, so a bookmark or a reload brings the same collection back
+        st.query_params["guest"] = token
+        user = guest_user(GUEST_SECRET, token)
+    return user
+
+
+@st.cache_resource
+def get_card_cache():
+    cache = CardCache(max_bytes=CARD_CACHE_MAX_BYTES)
+    metrics.register_stats("card_cache", cache.stats)
+    return cache
+
+
+@st.cache_resource
+def get_thumbnail_cache():
+    cache = ThumbnailCache(os.path.join(DATA_DIR, "thumbs"), width=THUMBNAIL_WIDTH, max_bytes=THUMBNAIL_MAX_BYTES,
+                           workers=THUMBNAIL_WORKERS, session=fetch.get_session())
+    metrics.register_stats("thumbnail_cache", cache.stats)
+    return cache
+
+
+def thumbnail_sources(df):
+    return get_thumbnail_cache().data_uris(df["thumbnail"])
+
+
+def render_cards(df):
+    return get_card_cache().render(df, images=thumbnail_sources)
+
+
+@st.fragment
+def like_button(vid, key):
+    # The full record is only looked up in the shared book table when the button is pressed
+    col1, col2 = st.columns([1, 2])
+    with col1:
+        if st.button("❤️ Like", key=key, use_container_width=True):
+            book = get_engine().books.record(vid)
+            if book is not None and vid not in st.session_state["liked_books"]:
+                first_like = not st.session_state["liked_books"]
+                st.session_state["liked_books"].add(book)
+                if first_like:
+                    # The recommendation section only exists once something is liked
+                    st.rerun()
+                st.success("✅ Added to liked books!")
+            else:
+                st.info("📌 Already in liked books")
+
+
+def render_book_list(refs, key):
+    # refs point into the shared book table; only the page on screen is materialized
+    books = get_engine().books
+    books.resolve(refs)
+    n_pages = page_count(len(refs))
+    page = 1
+    if n_pages > 1:
+        page = st.number_input(f"Page (of {n_pages})", min_value=1, max_value=n_pages, value=1, step=1,
+                               key=f"{key}_page")
+    page_df = books.frame(refs[page_slice(page, len(refs))])
+    if page < n_pages:
+        # Warm the next page's covers while this one is on screen
+        get_thumbnail_cache().prefetch(books.frame(refs[page_slice(page + 1, len(refs))])["thumbnail"].dropna())
+
+    for vid, html in zip(page_df["id"], render_cards(page_df)):
+        st.markdown(html, unsafe_allow_html=True)
+        like_button(vid, key=f"like_{key}_{vid}")
 
 
 # ---------------------------------
@@ -343,14 +433,22 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+get_metrics_server()
+get_category_feeds()
+
 if "liked_books" not in st.session_state:
-    st.session_state["liked_books"] = []
+    user = current_user()
+    # Anonymous visitors without a guest token keep their likes for this session only
+    st.session_state["liked_books"] = (get_likes_store().load(user) if user
+                                       else LikedBooks(table=get_engine().books))
 if "scroll_to_search" not in st.session_state:
     st.session_state["scroll_to_search"] = False
 if "show_rec" not in st.session_state:
     st.session_state["show_rec"] = False
 if "show_explore" not in st.session_state:
     st.session_state["show_explore"] = False
+if "memory" not in st.session_state:
+    st.session_state["memory"] = get_session_sizes().track()
 
 st.markdown("---")
 
@@ -365,95 +463,149 @@ with search_col1:
 with search_col2:
     search_button = st.button("🔍 Search", use_container_width=True)
 
-if search_button and query:
+# A changed query is answered from the local catalog straight away; the button always asks the Books API
+if query and (search_button or query != st.session_state.get("last_search")):
+    st.session_state["last_search"] = query
     with st.spinner("🔎 Searching for books..."):
-        raw = fetch_books(query)
-        df = extract_book_info(raw)
+        if search_button:
+            df, source = get_engine().search(query), "Google Books"
+        else:
+            df, source = get_engine().search_local_first(query, min_local=LOCAL_MIN_RESULTS)
+            source = {"local": "your catalog", "api": "Google Books"}.get(source, "your catalog and Google Books")
 
         if df.empty:
             st.error("❌ No results found. Try a different search term.")
         else:
-            st.session_state["df"] = df
-            st.success(f"✅ Found {len(df)} books matching '{query}'")
+            # Sessions keep refs into the shared book table, never their own copy of the results
+            st.session_state["results"] = get_engine().books.add(df)
+            st.session_state["query"] = query
+            st.success(f"✅ Found {len(df)} books matching '{query}' in {source}")
 
-if "df" in st.session_state:
-    df = st.session_state["df"]
+if "results" in st.session_state or "cat_books" in st.session_state:
+    results = st.session_state.get("results")
 
-    st.markdown('<h2>📘 Search Results</h2>', unsafe_allow_html=True)
+    if results is not None:
+        st.markdown('<h2>📘 Search Results</h2>', unsafe_allow_html=True)
 
-    for idx, (_, row) in enumerate(df.iterrows()):
-        display_book_card(row, key_prefix=f"search_{idx}")
-
-        lk = f"like_{row['id']}"
-        col1, col2, col3 = st.columns([1, 1, 2])
-        with col1:
-            if st.button("❤️ Like", key=lk, use_container_width=True):
-                if row.to_dict() not in st.session_state["liked_books"]:
-                    st.session_state["liked_books"].append(row.to_dict())
-                    st.success("✅ Added to liked books!")
-                    st.rerun()
-                else:
-                    st.info("📌 Already in liked books")
-
-        st.divider()
+        render_book_list(results, "search")
 
     # Recommendation Section
     if st.session_state["liked_books"]:
         st.markdown('<h2>⭐ Smart Recommendations</h2>', unsafe_allow_html=True)
 
-        liked_df = pd.DataFrame(st.session_state["liked_books"])
-        titles = liked_df["title"].tolist()
+        liked_df = st.session_state["liked_books"].frame()
+        liked_titles = dict(zip(liked_df["id"].astype(str), liked_df["title"]))
+
+        rec_mode = st.radio("Recommend for", ["📘 One liked book", "📚 My whole collection"], horizontal=True,
+                            label_visibility="collapsed")
+        whole_collection = rec_mode == "📚 My whole collection"
 
         rec_col1, rec_col2 = st.columns([2, 1])
 
         with rec_col1:
-            selected_title = st.selectbox("Select a liked book for recommendations", titles,
-                                          label_visibility="collapsed")
+            if whole_collection:
+                profile_mode = st.selectbox("Combine liked books by", ["centroid", "max"],
+                                            format_func=lambda m: {"centroid": "🎯 Overall taste (centroid)",
+                                                                   "max": "🔀 Closest to any liked book (max)"}[m],
+                                            label_visibility="collapsed")
+                selected_id = None
+            else:
+                selected_id = st.selectbox("Select a liked book for recommendations", list(liked_titles),
+                                           format_func=liked_titles.get, label_visibility="collapsed")
+            selected_title = liked_titles.get(selected_id)
 
         with rec_col2:
             top_k = st.slider("# of Recommendations", 3, 20, 6, label_visibility="collapsed")
 
+        catalog_size = get_catalog().count()
+        use_catalog = st.checkbox(f"📦 Recommend from the whole local catalog ({catalog_size} books)",
+                                  value=False)
+        diversify = st.checkbox("🌈 Diversify: favour well-rated and recent books, skip duplicate editions",
+                                value=True)
+
         if st.button("🎯 Generate Recommendations", use_container_width=True):
             with st.spinner("🤖 Generating AI recommendations..."):
-                # Build combined dataframe
-                combined_books = list(df.to_dict(orient='records')) + st.session_state["liked_books"]
-                combined_df = pd.DataFrame(combined_books).drop_duplicates(subset=['id'], keep='first')
-
-                if len(combined_df) < 2:
-                    st.warning("Need more books to generate recommendations.")
+                rec_df = None
+                liked_ids = liked_df["id"].astype(str).tolist()
+
+                precomputed = None
+                if use_catalog and not whole_collection:
+                    # Neighbours from the offline batch job, when it has covered this book
+                    precomputed = get_engine().more_like_this(selected_id, top_k,
+                                                              get_catalog().get if diversify else None)
+
+                if precomputed is not None:
+                    rec_ids, rec_scores = precomputed
+                    rec_df = get_catalog().get(rec_ids)
+                elif use_catalog:
+                    model = get_engine().catalog_model()
+                    seed_ids = liked_ids if whole_collection else [selected_id]
+
+                    if len(model.ids) < 2 or not any(vid in model.pos for vid in seed_ids):
+                        st.warning("Need more books to generate recommendations.")
+                    else:
+                        index = get_engine().catalog_index(model)
+                        books = get_catalog().get if diversify else None
+                        if whole_collection:
+                            rec_ids, rec_scores = get_engine().recommend_for_profile(model, seed_ids, top_k,
+                                                                                     profile_mode, index, books)
+                        else:
+                            rec_ids, rec_scores = get_engine().recommend(model, seed_ids[0], top_k, index, books)
+                        rec_df = get_catalog().get(rec_ids)
                 else:
-                    tfidf_matrix = build_tfidf(combined_df)
-                    idx = best_title_match(selected_title, combined_df)
-
-                    if idx is not None:
-                        rec_idxs = recommend(combined_df, tfidf_matrix, idx, top_k)
-
+                    # Build combined dataframe for this click only: results and likes come from the shared book
+                    # table, the corpus is the shared frame of the last search or browsed category; the corpus is
+                    # only needed to fit the model, so it is not interned
+                    corpus_df = get_engine().corpus(st.session_state.get("query", ""))
+                    result_dfs = [get_engine().books.frame(results)] if results is not None else []
+                    combined_df = (pd.concat(result_dfs + [corpus_df, st.session_state["liked_books"].frame()],
+                                             ignore_index=True)
+                                   .drop_duplicates(subset=["id"], keep="first").reset_index(drop=True))
+
+                    if len(combined_df) < 2:
+                        st.warning("Need more books to generate recommendations.")
+                    else:
+                        model = get_engine().model_for_frame(combined_df)
+                        positions = {vid: i for i, vid in enumerate(combined_df["id"].astype(str))}
+
+                        def frame_books(ids):
+                            return combined_df.iloc[[positions[vid] for vid in ids if vid in positions]]
+
+                        books = frame_books if diversify else None
+
+                        if whole_collection:
+                            rec_ids, rec_scores = get_engine().recommend_for_profile(model, liked_ids, top_k,
+                                                                                     profile_mode, books=books)
+                            rec_df = combined_df.iloc[[positions[vid] for vid in rec_ids]]
+                        else:
+                            book_id = selected_id if selected_id in model.pos else None
+                            if book_id is None:
+                                idx = get_engine().best_title_match(selected_title, combined_df)
+                                book_id = str(combined_df.at[idx, "id"]) if idx is not None else None
+
+                            if book_id is not None:
+                                rec_ids, rec_scores = get_engine().recommend(model, book_id, top_k, books=books)
+                                rec_df = combined_df.iloc[[positions[vid] for vid in rec_ids]]
+                            else:
+                                st.error("Could not match this book. Try another selection.")
+
+                if rec_df is not None:
+                    if whole_collection:
+                        st.markdown(f'<h3>📚 Recommended for your collection of {len(liked_ids)} books</h3>',
+                                    unsafe_allow_html=True)
+                    else:
                         st.markdown(f'<h3>📚 Recommended for you based on "{selected_title}"</h3>',
                                     unsafe_allow_html=True)
 
-                        for i, rec_idx in enumerate(rec_idxs, 1):
-                            st.markdown(f'<p style="color: var(--accent-color); font-weight: bold;">#{i}</p>',
-                                        unsafe_allow_html=True)
-                            book = combined_df.iloc[rec_idx]
-                            display_book_card(book, key_prefix=f"rec_{i}")
-
-                    else:
-                        st.error("Could not match this book. Try another selection.")
+                    for i, (html, score) in enumerate(zip(render_cards(rec_df), rec_scores), 1):
+                        st.markdown(f'<p style="color: var(--accent-color); font-weight: bold;">#{i} '
+                                    f'<span class="badge">🎯 {score:.0%} match</span></p>',
+                                    unsafe_allow_html=True)
+                        st.markdown(html, unsafe_allow_html=True)
 
 # Browse by Categories Section
 st.markdown('<h2>📚 Browse by Categories</h2>', unsafe_allow_html=True)
 
-categories = {
-    "Fiction": "fiction",
-    "Science Fiction": "science fiction",
-    "Mystery": "mystery thriller",
-    "Romance": "romance",
-    "Business": "business",
-    "Self-Help": "self-help",
-    "History": "history",
-    "Biography": "biography",
-}
-
 cat_col1, cat_col2 = st.columns([3, 1])
 
 with cat_col1:
@@ -462,28 +614,24 @@ with cat_col1:
 
 with cat_col2:
     if st.button("Browse 📖", use_container_width=True):
-        with st.spinner(f"Loading {selected_category} books..."):
-            raw = fetch_books(categories[selected_category], max_results=10)
-            cat_df = extract_book_info(raw)
-            st.session_state["cat_df"] = cat_df
+        feeds = get_category_feeds()
+        snapshot = feeds.get(selected_category)
+        if snapshot is None:
+            # Not warmed yet (or every refresh so far failed): load this one feed now
+            with st.spinner(f"Loading {selected_category} books..."):
+                feeds.refresh(selected_category)
+                snapshot = feeds.get(selected_category)
+        if snapshot is not None:
+            cat_df = snapshot.df
+        else:
+            cat_df = get_engine().search(categories[selected_category], CATEGORY_FEED_SIZE)
+        st.session_state["cat_books"] = get_engine().books.add(cat_df)
+        st.session_state["query"] = categories[selected_category]
 
-if "cat_df" in st.session_state and not st.session_state["cat_df"].empty:
+if "cat_books" in st.session_state and len(st.session_state["cat_books"]):
     st.markdown(f'<h3>Books in {selected_category}</h3>', unsafe_allow_html=True)
 
-    for idx, (_, row) in enumerate(st.session_state["cat_df"].iterrows()):
-        display_book_card(row, key_prefix=f"cat_{idx}")
-
-        col1, col2 = st.columns([1, 2])
-        with col1:
-            if st.button("❤️ Like", key=f"like_cat_{row['id']}", use_container_width=True):
-                if row.to_dict() not in st.session_state["liked_books"]:
-                    st.session_state["liked_books"].append(row.to_dict())
-                    st.success("✅ Added to liked books!")
-                    st.rerun()
-                else:
-                    st.info("📌 Already in liked books")
-
-        st.divider()
+    render_book_list(st.session_state["cat_books"], "cat")
 
 # Sidebar - Features & Liked Books with Hover Effects
 st.sidebar.markdown("""
@@ -590,7 +738,7 @@ if st.session_state["liked_books"]:
         f'<p style="color: var(--accent-color); font-weight: bold;">Total: {len(st.session_state["liked_books"])} books</p>',
         unsafe_allow_html=True)
 
-    for idx, lb in enumerate(st.session_state["liked_books"]):
+    for lb in st.session_state["liked_books"]:
         st.sidebar.markdown(f'''
         <div class="liked-book-item">
             <strong>{lb['title']}</strong>
@@ -598,12 +746,38 @@ if st.session_state["liked_books"]:
         </div>
         ''', unsafe_allow_html=True)
 
-        if st.sidebar.button(f"Remove", key=f"remove_{idx}", use_container_width=True):
-            st.session_state["liked_books"].pop(idx)
+        if st.sidebar.button(f"Remove", key=f"remove_{lb['id']}", use_container_width=True):
+            st.session_state["liked_books"].remove(lb["id"])
             st.rerun()
 else:
     st.sidebar.info("❌ No liked books yet. Like books to build your collection!")
 
+session_bytes = get_session_sizes().update(st.session_state["memory"], st.session_state.to_dict().values())
+
+if is_admin():
+    st.sidebar.markdown("---")
+    with st.sidebar.expander("⏱️ Performance", expanded=False):
+        stages = metrics.REGISTRY.stage_summary()
+        if stages:
+            st.dataframe(pd.DataFrame(stages).set_index("stage").round(2), use_container_width=True)
+        else:
+            st.caption("No pipeline stages timed yet.")
+
+        registry = metrics.REGISTRY
+        st.markdown(f"**API** {registry.total('kitab_api_requests_total')} requests · "
+                    f"{registry.total('kitab_api_errors_total')} errors · "
+                    f"{registry.total('kitab_api_timeouts_total')} timeouts · "
+                    f"{registry.total('kitab_api_retries_total')} retries · "
+                    f"{registry.total('kitab_api_stale_served_total')} stale served")
+        sessions, table = get_session_sizes().stats(), get_engine().books.stats()
+        st.markdown(f"**Memory** this session {session_bytes / 1024:.1f} KB · "
+                    f"{sessions['sessions']} sessions {sessions['bytes'] / 2 ** 20:.2f} MB · "
+                    f"book table {table['books']} books {table['bytes'] / 2 ** 20:.1f} MB")
+        for cache, rate in registry.hit_rates().items():
+            st.markdown(f"**{cache.replace('_', ' ')}** {rate:.0%} hit rate")
+        st.download_button("Download Prometheus metrics", metrics.export(), file_name="kitab-metrics.txt",
+                           mime="text/plain", use_container_width=True)
+
 st.sidebar.markdown("---")
 st.sidebar.markdown("""
 <p style="text-align: center; color: var(--text-secondary); font-size: 0.85rem;">
@@ -0,0 +1 @@
+# KitabAI - headless building blocks for the book recommendation app
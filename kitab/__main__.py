@@ -0,0 +1,138 @@
+# Command line entry point
+#
+#   python -m kitab serve --port 8500
+#   python -m kitab recommend ID [ID ...] -k 10
+#   python -m kitab recommend --input seeds.txt --output recs.jsonl
+#   python -m kitab search "dune" [--local]
+#   python -m kitab neighbours -k 50 --workers 8
+#   python -m kitab --vectorizer hashing ingest volumes.jsonl --progress
+
+import argparse
+import json
+import logging
+import os
+import sys
+
+from kitab.engine import DATA_DIR, SEARCH_RESULTS, TOP_K, Engine
+
+
+def _seed_lines(path):
+    # One job per line: comma/space separated ids, or a JSON object with "ids" (and optionally k, mode, query)
+    with (sys.stdin if path == "-" else open(path, encoding="utf-8")) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                yield json.loads(line)
+            else:
+                yield {"ids": line.replace(",", " ").split()}
+
+
+def cmd_recommend(engine, args):
+    jobs = _seed_lines(args.input) if args.input else [{"ids": args.ids}]
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        for job in jobs:
+            result = engine.recommend_for(job["ids"], int(job.get("k", args.k)), job.get("mode", args.mode),
+                                          job.get("query", args.query), job.get("rerank", not args.no_rerank))
+            out.write(json.dumps({"ids": job["ids"], **result}) + "\n")
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+def cmd_search(engine, args):
+    n = min(max(args.n, 1), SEARCH_RESULTS)
+    df = engine.search_local_first(args.query, n)[0] if args.local else engine.search(args.query, n)
+    for row in (df[["id", "title", "authors"]].astype(str).to_dict(orient="records") if not df.empty else []):
+        print(json.dumps(row))
+
+
+def cmd_neighbours(engine, args):
+    def progress(done, total):
+        print(f"\r{done}/{total} rows", end="", file=sys.stderr, flush=True)
+
+    result = engine.build_neighbours(args.k, args.workers, args.full, progress if args.progress else None)
+    if args.progress:
+        print(file=sys.stderr)
+    print(json.dumps(result))
+
+
+def cmd_ingest(engine, args):
+    def progress(done, total, books):
+        print(f"\r{done / max(total, 1):.1%} {books} books", end="", file=sys.stderr, flush=True)
+
+    result = engine.ingest(args.source, args.format, args.workers, args.restart, progress if args.progress else None)
+    if args.progress:
+        print(file=sys.stderr)
+    print(json.dumps(result))
+
+
+def cmd_serve(engine, args):
+    from kitab.server import serve
+    serve(engine, args.host, args.port, warm=not args.no_warm)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m kitab", description="Headless KitabAI recommendation engine")
+    parser.add_argument("--data-dir", default=os.environ.get("KITAB_DATA_DIR", DATA_DIR))
+    parser.add_argument("--url", default=os.environ.get("KITAB_BOOKS_URL"), help="Books API endpoint override")
+    parser.add_argument("--vectorizer", default=os.environ.get("KITAB_VECTORIZER", "tfidf"),
+                        choices=("tfidf", "hashing", "lsa"))
+    parser.add_argument("--lsa-dim", type=int, default=int(os.environ.get("KITAB_LSA_DIM", 0)) or None)
+    parser.add_argument("-v", "--verbose", action="store_true")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    recommend = commands.add_parser("recommend", help="recommend books for one or more seed ids")
+    recommend.add_argument("ids", nargs="*", help="seed volume ids (one job)")
+    recommend.add_argument("--input", help="file with one job per line, or - for stdin")
+    recommend.add_argument("--output", help="write JSON lines here instead of stdout")
+    recommend.add_argument("-k", type=int, default=TOP_K)
+    recommend.add_argument("--mode", default="centroid", choices=("centroid", "max"))
+    recommend.add_argument("--query", help="recommend from this query's corpus instead of the whole catalog")
+    recommend.add_argument("--no-rerank", action="store_true", help="rank by similarity alone")
+    recommend.set_defaults(run=cmd_recommend)
+
+    search = commands.add_parser("search", help="search the Books API and add the results to the catalog")
+    search.add_argument("query")
+    search.add_argument("-n", type=int, default=10, help=f"results, at most {SEARCH_RESULTS}")
+    search.add_argument("--local", action="store_true", help="search the catalog first, then the API")
+    search.set_defaults(run=cmd_search)
+
+    neighbours = commands.add_parser("neighbours", help="precompute top-k neighbours for the whole catalog")
+    neighbours.add_argument("-k", type=int, default=None, help="neighbours kept per book (default 50)")
+    neighbours.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    neighbours.add_argument("--full", action="store_true", help="recompute every book, not just new ones")
+    neighbours.add_argument("--progress", action="store_true")
+    neighbours.set_defaults(run=cmd_neighbours)
+
+    ingest = commands.add_parser("ingest", help="bulk import a JSONL or CSV dump into the catalog")
+    ingest.add_argument("source")
+    ingest.add_argument("--format", choices=("jsonl", "csv"), help="default: from the file extension")
+    ingest.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    ingest.add_argument("--restart", action="store_true", help="ignore the checkpoint of an interrupted import")
+    ingest.add_argument("--progress", action="store_true")
+    ingest.set_defaults(run=cmd_ingest)
+
+    serve = commands.add_parser("serve", help="serve recommendations over local HTTP JSON")
+    serve.add_argument("--host", default="127.0.0.1")
+    serve.add_argument("--port", type=int, default=8500)
+    serve.add_argument("--no-warm", action="store_true", help="skip fitting the catalog model at startup")
+    serve.set_defaults(run=cmd_serve)
+    return parser
+
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.command == "recommend" and not args.ids and not args.input:
+        parser.error("recommend needs seed ids or --input")
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING,
+                        format="%(asctime)s %(levelname)s %(name)s %(message)s")
+    engine = Engine(args.data_dir, url=args.url, vectorizer_mode=args.vectorizer, lsa_dim=args.lsa_dim)
+    args.run(engine, args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,182 @@
+# Approximate nearest-neighbour index for catalog-scale recommendation
+# IVF-style: books are projected to a small dense space, clustered into inverted lists,
+# and queries only scan the lists closest to them before an optional exact re-rank
+
+import copy
+import os
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import MiniBatchKMeans
+from sklearn.preprocessing import normalize
+from sklearn.random_projection import SparseRandomProjection
+
+from kitab import metrics
+from kitab.similarity import normalize_dense, top_k
+
+DIM = 256
+N_PROBE = 32
+TRAIN_SAMPLE = 50000
+
+
+class IVFIndex:
+    def __init__(self, dim=DIM, n_lists=None, n_probe=N_PROBE, seed=0):
+        self.dim = dim
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.seed = seed
+        self.feature_key = None
+        self.components = None
+        self.centroids = None
+        self.ids = []
+        self.pos = {}
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._lists = []
+
+    @property
+    def size(self):
+        return self._size
+
+    def project(self, matrix):
+        return normalize_dense((sp.csr_matrix(matrix, dtype=np.float32) @ self.components.T).toarray())
+
+    @metrics.stage("index")
+    def build(self, matrix, ids, feature_key=None):
+        n, n_features = matrix.shape
+        projector = SparseRandomProjection(n_components=self.dim, random_state=self.seed)
+        projector.fit(sp.csr_matrix((1, n_features), dtype=np.float32))
+        self.components = sp.csr_matrix(projector.components_, dtype=np.float32)
+        self.feature_key = feature_key
+
+        vectors = self.project(matrix)
+        n_lists = self.n_lists or max(1, min(int(4 * np.sqrt(n)), n // 8))
+        rng = np.random.default_rng(self.seed)
+        sample = vectors if n <= TRAIN_SAMPLE else vectors[rng.choice(n, TRAIN_SAMPLE, replace=False)]
+        kmeans = MiniBatchKMeans(n_clusters=n_lists, n_init=1, random_state=self.seed,
+                                 batch_size=max(1024, 4 * n_lists)).fit(sample)
+        self.centroids = normalize_dense(kmeans.cluster_centers_)
+        self.n_lists = n_lists
+
+        self.ids, self.pos = [], {}
+        self._vectors = np.empty((0, self.dim), dtype=np.float32)
+        self._size = 0
+        self._lists = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._append(vectors, ids)
+        return self
+
+    def _append(self, vectors, ids):
+        start = self._size
+        needed = start + len(vectors)
+        if needed > len(self._vectors):
+            grown = np.empty((max(needed, 2 * len(self._vectors)), self.dim), dtype=np.float32)
+            grown[:start] = self._vectors[:start]
+            self._vectors = grown
+        self._vectors[start:needed] = vectors
+        self._size = needed
+
+        assign = np.argmax(vectors @ self.centroids.T, axis=1)
+        rows = np.arange(start, needed)
+        for lst in np.unique(assign):
+            self._lists[lst] = np.concatenate([self._lists[lst], rows[assign == lst]])
+        for vid in ids:
+            self.pos[vid] = len(self.ids)
+            self.ids.append(vid)
+
+    def copy(self):
+        # Shares the stored rows; the capped vector view and fresh lists make the copy's first add reallocate
+        clone = copy.copy(self)
+        clone.ids = list(self.ids)
+        clone.pos = dict(self.pos)
+        clone._vectors = self._vectors[:self._size]
+        clone._lists = list(self._lists)
+        return clone
+
+    def add(self, matrix, ids):
+        ids = list(ids)
+        if ids:
+            self._append(self.project(matrix), ids)
+        return self
+
+    def candidates(self, vector, n_probe=None):
+        probes = min(n_probe or self.n_probe, self.n_lists)
+        closest = np.argpartition(-(self.centroids @ vector), probes - 1)[:probes]
+        return np.concatenate([self._lists[lst] for lst in closest])
+
+    def query(self, matrix, k, n_probe=None, exclude=(), exact_matrix=None):
+        # exact_matrix rows must line up with self.ids, which holds for any index built from a model prefix.
+        # Rows the matrix does not have yet (an index grown past an older model) are skipped
+        vector = self.project(matrix)[0]
+        cand = self.candidates(vector, n_probe)
+        if exact_matrix is not None:
+            cand = cand[cand < exact_matrix.shape[0]]
+        excluded = [self.pos[vid] for vid in exclude if vid in self.pos]
+        if excluded:
+            cand = cand[~np.isin(cand, excluded)]
+        if len(cand) == 0:
+            return [], np.empty(0, dtype=np.float32)
+        if exact_matrix is not None:
+            query_row = normalize(sp.csr_matrix(matrix, dtype=np.float32))
+            scores = np.asarray((exact_matrix[cand] @ query_row.T).todense()).ravel()
+        else:
+            scores = self._vectors[cand] @ vector
+        idx, sc = top_k(scores[None, :].astype(np.float32), k)
+        return [self.ids[cand[i]] for i in idx[0]], sc[0]
+
+    def compatible(self, feature_key, ids):
+        return (self.feature_key == feature_key and len(self.ids) <= len(ids)
+                and self.ids == list(ids[:len(self.ids)]))
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        lengths = np.array([len(lst) for lst in self._lists], dtype=np.int64)
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, dim=self.dim, n_probe=self.n_probe, seed=self.seed,
+                 feature_key=np.array(self.feature_key or ""), ids=np.array(self.ids, dtype=str),
+                 vectors=self._vectors[:self._size], centroids=self.centroids,
+                 lists=np.concatenate(self._lists) if self._lists else np.empty(0, dtype=np.int64),
+                 list_lengths=lengths, comp_data=self.components.data, comp_indices=self.components.indices,
+                 comp_indptr=self.components.indptr, comp_shape=np.array(self.components.shape))
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            index = cls(dim=int(data["dim"]), n_lists=len(data["list_lengths"]), n_probe=int(data["n_probe"]),
+                        seed=int(data["seed"]))
+            index.feature_key = str(data["feature_key"]) or None
+            index.components = sp.csr_matrix((data["comp_data"], data["comp_indices"], data["comp_indptr"]),
+                                             shape=tuple(data["comp_shape"]))
+            index.centroids = data["centroids"]
+            index._vectors = np.ascontiguousarray(data["vectors"])
+            index._size = len(index._vectors)
+            index._lists = np.split(data["lists"], np.cumsum(data["list_lengths"])[:-1])
+            index.ids = data["ids"].tolist()
+            index.pos = {vid: i for i, vid in enumerate(index.ids)}
+        return index
+
+
+def load_or_build(path, matrix, ids, feature_key, n_probe=N_PROBE):
+    ids = list(ids)
+    index = IVFIndex.load(path) if path and os.path.exists(path) else None
+    if index is None or not index.compatible(feature_key, ids):
+        index = IVFIndex(n_probe=n_probe).build(matrix, ids, feature_key)
+    elif index.size < len(ids):
+        index.add(matrix[index.size:], ids[index.size:])
+    index.n_probe = n_probe
+    if path:
+        index.save(path)
+    return index
+
+
+def recall_at_k(index, engine, rows, k, n_probe=None, exact=True):
+    hits = 0
+    total = 0
+    for row in rows:
+        truth_idx, _ = engine.query([row], k)
+        truth = {index.ids[i] for i in truth_idx[0]}
+        found, _ = index.query(engine.matrix[row], k, n_probe=n_probe, exclude=[index.ids[row]],
+                               exact_matrix=engine.matrix if exact else None)
+        hits += len(truth.intersection(found))
+        total += len(truth)
+    return hits / total if total else 1.0
@@ -0,0 +1,187 @@
+# Interned book table
+# One process-wide copy of the books sessions are looking at. Sessions keep BookRefs (ids plus rows into the
+# table) and frames are assembled by index selection, so a book's text exists once however many sessions and
+# result lists refer to it. The table is bounded by bytes: when full it starts a new generation, and refs from
+# an older one are resolved again by id, reloading their books from the catalog
+
+import sys
+import threading
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from kitab.catalog import COLUMNS
+from kitab.columnar import book_record
+
+MAX_BYTES = 64 * 1024 * 1024
+TEXT_COLUMNS = ("title", "authors", "description", "categories", "thumbnail", "published_date")
+# Few distinct values, repeated across many books
+SHARED_COLUMNS = ("authors", "categories", "published_date")
+
+
+def _strings(values):
+    return [v if isinstance(v, str) else None for v in values.tolist()]
+
+
+def _numbers(df, col, dtype):
+    if col not in df:
+        return np.full(len(df), np.nan, dtype=dtype)
+    return pd.to_numeric(df[col], errors="coerce").to_numpy(dtype=dtype, na_value=np.nan)
+
+
+class BookRefs:
+    # What a session keeps: ids survive a new table generation, rows are the fast path within one
+    __slots__ = ("ids", "rows", "generation")
+
+    def __init__(self, ids, rows, generation):
+        self.ids = np.asarray(ids, dtype=str)
+        self.rows = rows
+        self.generation = generation
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        return BookRefs(self.ids[index], self.rows[index], self.generation)
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + self.ids.nbytes + self.rows.nbytes
+
+
+class _Generation:
+    # Lists and arrays only ever grow within a generation, so reading existing rows needs no lock
+    def __init__(self, number):
+        self.number = number
+        self.ids = []
+        self.pos = {}
+        self.text = {col: [] for col in TEXT_COLUMNS}
+        self.pages = array("i")
+        self.pages_missing = array("b")
+        self.rating = array("f")
+        self.values = {}
+        self.bytes = 0
+
+    def _intern(self, value):
+        shared = self.values.setdefault(value, value)
+        if shared is value and value is not None:
+            self.bytes += sys.getsizeof(value)
+        return shared
+
+    def append(self, df, ids):
+        for col in TEXT_COLUMNS:
+            values = _strings(df[col]) if col in df else [None] * len(ids)
+            if col in SHARED_COLUMNS:
+                values = [self._intern(v) for v in values]
+            else:
+                self.bytes += sum(sys.getsizeof(v) for v in values if v is not None)
+            self.text[col].extend(values)
+        pages = _numbers(df, "page_count", np.float64)
+        self.pages.extend(np.nan_to_num(pages).astype(np.int32).tolist())
+        self.pages_missing.extend(np.isnan(pages).astype(np.int8).tolist())
+        self.rating.extend(_numbers(df, "rating", np.float32).tolist())
+        self.bytes += len(ids) * (self.pages.itemsize + self.pages_missing.itemsize + self.rating.itemsize)
+        for vid in ids:
+            self.pos[vid] = len(self.ids)
+            self.ids.append(vid)
+            self.bytes += sys.getsizeof(vid)
+
+    def frame(self, rows):
+        rows = np.asarray(rows, dtype=np.int64).tolist()
+        data = {"id": [self.ids[r] for r in rows]}
+        for col in TEXT_COLUMNS:
+            values = self.text[col]
+            data[col] = [values[r] for r in rows]
+        pages, missing, rating = self.pages, self.pages_missing, self.rating
+        data["page_count"] = pd.arrays.IntegerArray(np.array([pages[r] for r in rows], dtype=np.int32),
+                                                    np.array([missing[r] for r in rows], dtype=np.bool_))
+        values = np.array([rating[r] for r in rows], dtype=np.float32)
+        data["rating"] = pd.arrays.FloatingArray(values, np.isnan(values))
+        return pd.DataFrame(data, columns=COLUMNS)
+
+
+class BookTable:
+    def __init__(self, load=None, max_bytes=MAX_BYTES):
+        # load(ids) returns a frame of books by id (Catalog.get); without it the table is never reset
+        self.load = load
+        self.max_bytes = max_bytes
+        self.resets = 0
+        self._gen = _Generation(0)
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._gen.ids)
+
+    def _intern(self, df, reset=True):
+        # Caller holds the lock. Books already in the current generation keep their first row
+        gen = self._gen
+        ids = df["id"].astype(str).tolist()
+        first = {}
+        for i, vid in enumerate(ids):
+            if vid not in gen.pos:
+                first.setdefault(vid, i)
+        if first and reset and self.load is not None and self.max_bytes is not None and gen.bytes > self.max_bytes:
+            gen = self._gen = _Generation(gen.number + 1)
+            self.resets += 1
+            first = {}
+            for i, vid in enumerate(ids):
+                first.setdefault(vid, i)
+        if first:
+            gen.append(df.iloc[list(first.values())], list(first))
+        return gen
+
+    def add(self, df):
+        # Returns refs to every book in df, in order
+        if df is None or df.empty:
+            return BookRefs([], np.empty(0, dtype=np.int32), self._gen.number)
+        with self._lock:
+            gen = self._intern(df)
+        ids = df["id"].astype(str).tolist()
+        return BookRefs(ids, np.fromiter((gen.pos[vid] for vid in ids), dtype=np.int32, count=len(ids)), gen.number)
+
+    def add_records(self, records):
+        return self.add(pd.DataFrame(list(records)))
+
+    def _lookup(self, ids):
+        # Ids missing from the current generation are reloaded; ids found nowhere are skipped, like Catalog.get
+        gen = self._gen
+        if self.load is not None and any(vid not in gen.pos for vid in ids):
+            with self._lock:
+                gen = self._gen
+                missing = [vid for vid in ids if vid not in gen.pos]
+                if missing:
+                    gen = self._intern(self.load(missing))
+                    # A reset drops the books that were already present, so those are loaded into the new one
+                    missing = [vid for vid in ids if vid not in gen.pos]
+                    if missing:
+                        gen = self._intern(self.load(missing), reset=False)
+        ids = [vid for vid in ids if vid in gen.pos]
+        return gen, BookRefs(ids, np.fromiter((gen.pos[vid] for vid in ids), dtype=np.int32, count=len(ids)),
+                             gen.number)
+
+    def refs(self, ids):
+        return self._lookup([str(vid) for vid in ids])[1]
+
+    def resolve(self, refs):
+        # Updates refs from an older generation in place, so a session pays for the reload once
+        gen = self._gen
+        if refs.generation != gen.number:
+            gen, fresh = self._lookup(refs.ids.tolist())
+            refs.ids, refs.rows, refs.generation = fresh.ids, fresh.rows, fresh.generation
+        return gen
+
+    def frame(self, refs):
+        # The generation is captured once, so a concurrent reset cannot mix rows of two generations
+        return self.resolve(refs).frame(refs.rows)
+
+    def get(self, ids):
+        gen, refs = self._lookup([str(vid) for vid in ids])
+        return gen.frame(refs.rows)
+
+    def record(self, vid):
+        df = self.get([vid])
+        return book_record(df.iloc[0]) if not df.empty else None
+
+    def stats(self):
+        gen = self._gen
+        return {"books": len(gen.ids), "bytes": gen.bytes, "generation": gen.number, "resets": self.resets}
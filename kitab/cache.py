@@ -0,0 +1,118 @@
+# Persistent response cache for Google Books API calls
+# SQLite store of zlib-compressed JSON payloads with TTL expiry and LRU eviction.
+# Entries past the TTL are kept for a further stale window, so callers can serve them while refreshing
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+def normalize_query(query: str):
+    return " ".join(str(query).lower().split())
+
+
+def cache_key(query: str, max_results: int, start_index: int = 0):
+    key = f"{normalize_query(query)}|{int(max_results)}"
+    if start_index:
+        key += f"|{int(start_index)}"
+    return key
+
+
+class ResponseCache:
+    def __init__(self, path, ttl=6 * 3600, max_entries=5000, max_bytes=64 * 1024 * 1024, stale_ttl=24 * 3600):
+        self.path = path
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+        self.stale = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created REAL NOT NULL,
+                accessed REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)")
+
+    def lookup(self, key):
+        # Returns (items, fresh); stale items are still returned until the stale window runs out
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT payload, created FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None, False
+            payload, created = row
+            age = now - created
+            if age > self.ttl + self.stale_ttl:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self.expired += 1
+                self.misses += 1
+                return None, False
+            self._conn.execute("UPDATE responses SET accessed = ? WHERE key = ?", (now, key))
+            fresh = age <= self.ttl
+            if fresh:
+                self.hits += 1
+            else:
+                self.stale += 1
+                self.misses += 1
+        return json.loads(zlib.decompress(payload)), fresh
+
+    def put(self, key, items):
+        payload = zlib.compress(json.dumps(items, separators=(",", ":")).encode("utf-8"), 6)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, payload, size, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, payload, len(payload), now, now))
+            self._evict()
+
+    def _evict(self):
+        count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+        victims = []
+        for key, size in self._conn.execute("SELECT key, size FROM responses ORDER BY accessed"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            victims.append((key,))
+            count -= 1
+            total -= size
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+
+    def stats(self):
+        with self._lock:
+            count, total = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "expired": self.expired,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "entries": count,
+            "bytes": total,
+        }
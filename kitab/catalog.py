@@ -0,0 +1,127 @@
+# Local persistent book catalog
+# Every parsed volume is upserted here; rows are read back lazily in batches
+
+import os
+import sqlite3
+import threading
+import time
+
+import pandas as pd
+
+COLUMNS = ["id", "title", "authors", "description", "categories", "thumbnail", "published_date", "page_count",
+           "rating"]
+TEXT_SQL = ("COALESCE(title, '') || ' ' || COALESCE(authors, '') || ' ' || "
+            "COALESCE(description, '') || ' ' || COALESCE(categories, '')")
+MAX_PARAMS = 500
+
+
+def _clean(value):
+    if value is None or value == "N/A":
+        return None
+    try:
+        if pd.isna(value):
+            return None
+    except (TypeError, ValueError):
+        pass
+    return value
+
+
+class Catalog:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                id TEXT PRIMARY KEY,
+                title TEXT,
+                authors TEXT,
+                description TEXT,
+                categories TEXT,
+                thumbnail TEXT,
+                published_date TEXT,
+                page_count INTEGER,
+                rating REAL,
+                updated REAL NOT NULL
+            )
+        """)
+        # Older catalogs carry title and author indexes that nothing queries but every upsert maintains
+        self._conn.execute("DROP INDEX IF EXISTS books_title")
+        self._conn.execute("DROP INDEX IF EXISTS books_authors")
+
+    def upsert(self, df):
+        if df is None or df.empty:
+            return 0
+        now = time.time()
+        rows = [
+            tuple(_clean(rec.get(col)) for col in COLUMNS) + (now,)
+            for rec in df.to_dict(orient="records") if _clean(rec.get("id")) is not None
+        ]
+        updates = ", ".join(f"{col} = excluded.{col}" for col in COLUMNS[1:] + ["updated"])
+        sql = (f"INSERT INTO books ({', '.join(COLUMNS)}, updated) VALUES ({', '.join('?' * (len(COLUMNS) + 1))}) "
+               f"ON CONFLICT(id) DO UPDATE SET {updates}")
+        with self._lock:
+            self._conn.execute("BEGIN")
+            self._conn.executemany(sql, rows)
+            self._conn.execute("COMMIT")
+        return len(rows)
+
+    def count(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
+
+    def _frame(self, rows, columns):
+        df = pd.DataFrame(rows, columns=columns)
+        if "page_count" in df:
+            df["page_count"] = df["page_count"].astype("Int32")
+        if "rating" in df:
+            df["rating"] = df["rating"].astype("Float32")
+        for col in ("authors", "description", "categories", "thumbnail"):
+            if col in df:
+                df[col] = df[col].fillna("")
+        return df
+
+    def get(self, ids):
+        ids = list(ids)
+        found = {}
+        with self._lock:
+            for start in range(0, len(ids), MAX_PARAMS):
+                chunk = ids[start:start + MAX_PARAMS]
+                sql = f"SELECT {', '.join(COLUMNS)} FROM books WHERE id IN ({', '.join('?' * len(chunk))})"
+                for row in self._conn.execute(sql, chunk):
+                    found[row[0]] = row
+        return self._frame([found[i] for i in ids if i in found], COLUMNS)
+
+    def ids(self):
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT id FROM books ORDER BY rowid")]
+
+    def texts(self, ids, batch_size=MAX_PARAMS):
+        ids = list(ids)
+        for start in range(0, len(ids), batch_size):
+            chunk = ids[start:start + batch_size]
+            with self._lock:
+                rows = dict(self._conn.execute(
+                    f"SELECT id, {TEXT_SQL} FROM books WHERE id IN ({', '.join('?' * len(chunk))})", chunk))
+            for vid in chunk:
+                yield rows.get(vid, "")
+
+    def iter_texts(self, batch_size=5000, ids=None):
+        conn = sqlite3.connect(self.path, check_same_thread=False) if self.path != ":memory:" else self._conn
+        try:
+            cur = conn.execute(f"SELECT id, {TEXT_SQL} FROM books ORDER BY rowid")
+            while True:
+                rows = cur.fetchmany(batch_size)
+                if not rows:
+                    break
+                for vid, text in rows:
+                    if ids is not None:
+                        ids.append(vid)
+                    yield text
+        finally:
+            if conn is not self._conn:
+                conn.close()
@@ -0,0 +1,109 @@
+# Columnar parsing of Google Books volumes
+# Items are appended straight into typed arrays and materialized as a compact DataFrame
+
+import math
+from array import array
+
+import numpy as np
+import pandas as pd
+
+from kitab import metrics
+
+MISSING = "N/A"
+
+
+class BookColumns:
+    def __init__(self):
+        self.ids = []
+        self.titles = []
+        self.descriptions = []
+        self.thumbnails = []
+        self.published_dates = []
+        self.page_count = array("i")
+        self.page_count_missing = array("b")
+        self.rating = array("f")
+        self.category_codes = array("i")
+        self.category_values = []
+        self._category_lookup = {}
+        self.author_offsets = array("i", [0])
+        self.author_codes = array("i")
+        self.author_values = []
+        self._author_lookup = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def _intern(self, value, lookup, values):
+        code = lookup.get(value)
+        if code is None:
+            code = lookup[value] = len(values)
+            values.append(value)
+        return code
+
+    def append(self, item):
+        info = item.get("volumeInfo", {})
+        self.ids.append(item.get("id"))
+        self.titles.append(info.get("title", "No Title"))
+        self.descriptions.append(info.get("description", ""))
+        self.thumbnails.append(info.get("imageLinks", {}).get("thumbnail", ""))
+        self.published_dates.append(info.get("publishedDate", MISSING))
+
+        pages = info.get("pageCount")
+        self.page_count.append(int(pages) if pages is not None else 0)
+        self.page_count_missing.append(pages is None)
+        rating = info.get("averageRating")
+        self.rating.append(float(rating) if rating is not None else math.nan)
+
+        categories = ", ".join(info.get("categories", []))
+        self.category_codes.append(self._intern(categories, self._category_lookup, self.category_values))
+        for author in info.get("authors", []):
+            self.author_codes.append(self._intern(author, self._author_lookup, self.author_values))
+        self.author_offsets.append(len(self.author_codes))
+
+    def extend(self, items):
+        for item in items:
+            self.append(item)
+        return self
+
+    def authors_of(self, row):
+        start, end = self.author_offsets[row], self.author_offsets[row + 1]
+        return [self.author_values[code] for code in self.author_codes[start:end]]
+
+    def authors_joined(self):
+        return [", ".join(self.authors_of(row)) for row in range(len(self))]
+
+    def to_frame(self):
+        if not self.ids:
+            return pd.DataFrame()
+        rating = np.frombuffer(self.rating, dtype=np.float32)
+        authors = self.authors_joined()
+        return pd.DataFrame({
+            "id": self.ids,
+            "title": self.titles,
+            "authors": pd.Categorical(authors),
+            "description": self.descriptions,
+            "categories": pd.Categorical.from_codes(np.frombuffer(self.category_codes, dtype=np.int32),
+                                                    categories=pd.Index(self.category_values, dtype=object)),
+            "thumbnail": self.thumbnails,
+            "published_date": self.published_dates,
+            "page_count": pd.arrays.IntegerArray(np.frombuffer(self.page_count, dtype=np.int32).copy(),
+                                                 np.frombuffer(self.page_count_missing, dtype=np.bool_).copy()),
+            "rating": pd.arrays.FloatingArray(rating.copy(), np.isnan(rating)),
+        })
+
+
+@metrics.stage("parse")
+def parse_volumes(items):
+    return BookColumns().extend(items).to_frame()
+
+
+def is_missing(value):
+    if value is None or value is pd.NA or (isinstance(value, str) and value == MISSING):
+        return True
+    return isinstance(value, (float, np.floating)) and math.isnan(value)
+
+
+def book_record(row):
+    # Plain dict with missing numbers spelled "N/A", safe to compare and to store in session state
+    return {key: (MISSING if key in ("page_count", "rating") and is_missing(value) else value)
+            for key, value in row.items()}
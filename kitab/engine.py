@@ -0,0 +1,403 @@
+# Headless recommendation engine
+# Fetch, parse, vectorize and recommend without Streamlit. pandas, scikit-learn and requests are only imported
+# when first needed, and the caches and fitted models live as long as the engine does
+
+import os
+import threading
+
+from kitab import metrics
+
+DATA_DIR = ".kitab"
+CACHE_TTL_SECONDS = 6 * 3600
+CACHE_STALE_SECONDS = 24 * 3600
+CACHE_MAX_ENTRIES = 5000
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+CORPUS_SIZE = 400
+SEARCH_RESULTS = 40
+LOCAL_MIN_RESULTS = 8
+LOCAL_MIN_COVERAGE = 1.0
+SHARED_MAX_ENTRIES = 256
+SHARED_MAX_BYTES = 256 * 1024 * 1024
+MAX_MODELS = 16
+MAX_MODEL_BYTES = 512 * 1024 * 1024
+BOOK_TABLE_MAX_BYTES = 64 * 1024 * 1024
+ANN_MIN_DOCS = 20000
+SAVE_FRACTION = 0.05
+TOP_K = 10
+RESULT_COLUMNS = ("id", "title", "authors", "categories", "thumbnail", "published_date", "rating")
+
+
+class Engine:
+    def __init__(self, data_dir=DATA_DIR, url=None, cache_ttl=CACHE_TTL_SECONDS, cache_stale_ttl=CACHE_STALE_SECONDS,
+                 cache_max_entries=CACHE_MAX_ENTRIES, cache_max_bytes=CACHE_MAX_BYTES, corpus_size=CORPUS_SIZE,
+                 vectorizer_mode="tfidf",
+                 max_models=MAX_MODELS, shared_max_entries=SHARED_MAX_ENTRIES, shared_max_bytes=SHARED_MAX_BYTES,
+                 ann_min_docs=ANN_MIN_DOCS, ann_probes=None, lsa_dim=None, max_model_bytes=MAX_MODEL_BYTES,
+                 book_table_max_bytes=BOOK_TABLE_MAX_BYTES):
+        self.data_dir = data_dir
+        self.url = url
+        self.cache_ttl = cache_ttl
+        self.cache_stale_ttl = cache_stale_ttl
+        self.cache_max_entries = cache_max_entries
+        self.cache_max_bytes = cache_max_bytes
+        self.corpus_size = corpus_size
+        self.vectorizer_mode = vectorizer_mode
+        self.max_models = max_models
+        self.max_model_bytes = max_model_bytes
+        self.book_table_max_bytes = book_table_max_bytes
+        self.shared_max_entries = shared_max_entries
+        self.shared_max_bytes = shared_max_bytes
+        self.ann_min_docs = ann_min_docs
+        self.ann_probes = ann_probes
+        self.lsa_dim = lsa_dim
+        self._objects = {}
+        self._lock = threading.RLock()
+
+    def _path(self, name):
+        return os.path.join(self.data_dir, name)
+
+    def _lazy(self, name, factory):
+        value = self._objects.get(name)
+        if value is None:
+            with self._lock:
+                value = self._objects.get(name)
+                if value is None:
+                    value = self._objects[name] = factory()
+        return value
+
+    @property
+    def response_cache(self):
+        def create():
+            from kitab import fetch
+            from kitab.cache import ResponseCache
+            cache = ResponseCache(self._path("responses.sqlite3"), ttl=self.cache_ttl,
+                                  max_entries=self.cache_max_entries, max_bytes=self.cache_max_bytes,
+                                  stale_ttl=self.cache_stale_ttl)
+            metrics.register_stats("response_cache", cache.stats)
+            metrics.register_stats("books_api", fetch.stats)
+            return cache
+        return self._lazy("response_cache", create)
+
+    @property
+    def shared(self):
+        def create():
+            from kitab.shared import SharedRegistry
+            shared = SharedRegistry(max_entries=self.shared_max_entries, max_bytes=self.shared_max_bytes,
+                                    ttl=self.cache_ttl)
+            metrics.register_stats("shared", shared.stats)
+            return shared
+        return self._lazy("shared", create)
+
+    @property
+    def catalog(self):
+        def create():
+            from kitab.catalog import Catalog
+            catalog = Catalog(self._path("catalog.sqlite3"))
+            metrics.register_stats("catalog", lambda: {"books": catalog.count()})
+            return catalog
+        return self._lazy("catalog", create)
+
+    @property
+    def books(self):
+        def create():
+            from kitab.books import BookTable
+            # Books dropped when the table starts a new generation are reloaded from the catalog
+            table = BookTable(load=self.catalog.get, max_bytes=self.book_table_max_bytes)
+            metrics.register_stats("book_table", table.stats)
+            return table
+        return self._lazy("books", create)
+
+    @property
+    def search_index(self):
+        def create():
+            from kitab.search import SearchIndex
+            index, ids = SearchIndex(), []
+            texts = list(self.catalog.iter_texts(ids=ids))
+            index.add(ids, texts)
+            metrics.register_stats("search_index", index.stats)
+            return index
+        return self._lazy("search_index", create)
+
+    @property
+    def vectorizers(self):
+        def create():
+            from kitab.vectorize import LSA_DIM, VectorizerCache
+            cache = VectorizerCache(mode=self.vectorizer_mode, max_models=self.max_models,
+                                    max_bytes=self.max_model_bytes, dim=self.lsa_dim or LSA_DIM)
+            metrics.register_stats("vectorizer_cache", cache.stats)
+            return cache
+        return self._lazy("vectorizers", create)
+
+    def _url_kwargs(self):
+        return {"url": self.url} if self.url else {}
+
+    def fetch_books(self, query, max_results=SEARCH_RESULTS):
+        from kitab import fetch
+        return fetch.fetch_books(query, max_results, cache=self.response_cache, **self._url_kwargs())
+
+    def fetch_corpus(self, query, total=None):
+        from kitab import fetch
+        return fetch.fetch_books_paged(query, total or self.corpus_size, cache=self.response_cache,
+                                       **self._url_kwargs())
+
+    def extract_book_info(self, items):
+        from kitab.columnar import parse_volumes
+        df = parse_volumes(items)
+        self.catalog.upsert(df)
+        index = self._objects.get("search_index")
+        if index is not None and not df.empty:
+            new_ids = [vid for vid in df["id"].astype(str) if vid not in index.pos]
+            index.add(new_ids, self.catalog.texts(new_ids))
+        return df
+
+    def search(self, query, max_results=SEARCH_RESULTS):
+        from kitab.cache import normalize_query
+        # Parsed frames are shared read-only by every caller asking the same query
+        return self.shared.get_or_build(
+            ("search", normalize_query(query), max_results),
+            lambda: self.extract_book_info(self.fetch_books(query, max_results)),
+            keep=lambda df: not df.empty)
+
+    def local_search(self, query, n=SEARCH_RESULTS):
+        index = self.search_index
+        matches = index.search(query, n)
+        scores = {index.ids[row]: score for row, score in matches}
+        coverage = dict(zip(scores, index.coverage(query, [row for row, _ in matches]).tolist()))
+        df = self.catalog.get(list(scores))
+        df["score"] = df["id"].map(scores)
+        df["coverage"] = df["id"].map(coverage)
+        return df
+
+    def search_local_first(self, query, max_results=SEARCH_RESULTS, min_local=LOCAL_MIN_RESULTS,
+                           min_coverage=LOCAL_MIN_COVERAGE):
+        # The catalog answers in milliseconds; the Books API is only asked when it knows too few matching books.
+        # Only books matching enough of the query count: BM25 ranks any book sharing one word with it
+        local = self.local_search(query, max_results)
+        strong = int((local["coverage"] >= min_coverage).sum()) if not local.empty else 0
+        if strong >= min(min_local, max_results):
+            return local, "local"
+        remote = self.search(query, max_results)
+        if local.empty:
+            return remote, "api"
+        import pandas as pd
+        merged = pd.concat([local.drop(columns=["score", "coverage"]), remote], ignore_index=True)
+        merged = merged.drop_duplicates(subset=["id"], keep="first").head(max_results).reset_index(drop=True)
+        return merged, "mixed" if not remote.empty else "local"
+
+    def corpus(self, query, total=None):
+        from kitab.cache import normalize_query
+        total = total or self.corpus_size
+        return self.shared.get_or_build(
+            ("corpus", normalize_query(query), total),
+            lambda: self.extract_book_info(self.fetch_corpus(query, total)),
+            keep=lambda df: not df.empty)
+
+    def _record_corpus_size(self, model, source):
+        metrics.gauge("kitab_corpus_size", "Documents in the latest model used for recommendations",
+                      source=source).set(len(model.ids))
+        return model
+
+    def model_for_frame(self, df):
+        return self._record_corpus_size(self.vectorizers.model_for_frame(df), "query")
+
+    def saved_model_path(self):
+        return self._path(f"catalog_{self.vectorizer_mode}.npz")
+
+    def catalog_model(self):
+        from kitab.vectorize import SAVED_MODES
+        catalog = self.catalog
+        if self.vectorizer_mode not in SAVED_MODES:
+            return self._record_corpus_size(self.vectorizers.model_for(catalog.ids(), catalog.texts), "catalog")
+
+        # The LSA projection and the hashing counts are saved next to the catalog and reloaded, so a restart
+        # (or a bulk import) extends them instead of vectorizing the whole catalog again
+        path = self.saved_model_path()
+        self._lazy("saved_model", lambda: self._load_saved_model(path))
+        model = self.vectorizers.model_for(catalog.ids(), catalog.texts)
+        # A refit is written straight away; appended rows are batched so a growing catalog is not rewritten
+        # on every new book
+        saved_size = self._objects.get("saved_sizes", {}).get(model.feature_key)
+        if saved_size is None or len(model.ids) - saved_size >= SAVE_FRACTION * saved_size:
+            model.save(path)
+            self._objects["saved_sizes"] = {model.feature_key: len(model.ids)}
+        return self._record_corpus_size(model, "catalog")
+
+    def _load_saved_model(self, path):
+        from kitab.vectorize import TfidfModel
+        if os.path.exists(path):
+            model = TfidfModel.load(path)
+            if model.mode == self.vectorizer_mode and (model.mode != "lsa" or model.dim == (self.lsa_dim or model.dim)):
+                self.vectorizers.adopt(model)
+                self._objects["saved_sizes"] = {model.feature_key: len(model.ids)}
+        return True
+
+    def catalog_index(self, model):
+        # Exact search stays the default until the catalog is large enough for the approximate index to pay off
+        # Dense LSA vectors are already cheap to scan with BLAS, so they never use the approximate index
+        if len(model.ids) < self.ann_min_docs or model.mode == "lsa":
+            return None
+        if model.ann is None:
+            from kitab import ann
+            model.ann = ann.load_or_build(self._path("catalog_ann.npz"), model.matrix, model.ids,
+                                          model.feature_key, n_probe=self.ann_probes or ann.N_PROBE)
+        return model.ann
+
+    def ingest(self, source, fmt=None, workers=None, restart=False, progress=None):
+        from kitab import ingest
+        result = ingest.run(self, source, fmt, workers, restart=restart, progress=progress)
+        # Rebuilt lazily from the grown catalog; the vectorizer cache picks up the saved hashing model
+        with self._lock:
+            for name in ("search_index", "saved_model"):
+                self._objects.pop(name, None)
+        return result
+
+    def neighbour_table(self):
+        from kitab.neighbours import META, NeighbourTable
+        directory = self._path("neighbours")
+        try:
+            mtime = os.stat(os.path.join(directory, META)).st_mtime
+        except OSError:
+            return None
+        # Reopened whenever the batch job has replaced the arrays since the last lookup
+        cached = self._objects.get("neighbours")
+        if cached is None or cached[0] != mtime:
+            cached = self._objects["neighbours"] = (mtime, NeighbourTable.open(directory))
+        return cached[1]
+
+    def more_like_this(self, book_id, top_k, books=None):
+        table = self.neighbour_table()
+        if table is None or top_k > table.k:
+            return None
+        found = table.lookup(book_id, table.k if books is not None else top_k)
+        if found is None or books is None:
+            return found
+        # Stored neighbours carry scores but no vectors, so only the quality and duplicate signals re-rank them
+        return self._rerank(None, *found, top_k, books, [book_id])
+
+    def build_neighbours(self, k=None, workers=None, full=False, progress=None):
+        from kitab import neighbours
+        model = self.catalog_model()
+        return neighbours.build(model.similarity().matrix, model.ids, self._path("neighbours"), k or neighbours.K,
+                                workers=workers, feature_key=model.feature_key, full=full, progress=progress)
+
+    def warm(self):
+        self.search_index
+        model = self.catalog_model()
+        if len(model.ids) > 1:
+            model.similarity()
+            self.catalog_index(model)
+        return model
+
+    def best_title_match(self, title, df):
+        # Sessions rebuild the same frame on every click, so its trigram index is shared, keyed by row order
+        import hashlib
+        from kitab.titles import TitleIndex
+        ids = df["id"].astype(str).tolist()
+        key = hashlib.blake2b("\0".join(ids).encode("utf-8"), digest_size=16).hexdigest()
+        index = self.shared.get_or_build(("titles", key), lambda: TitleIndex(ids, df["title"].tolist()))
+        row = index.best_match(title)
+        if row is not None:
+            return df.index[row]
+        return None
+
+    @staticmethod
+    def _rerank(model, rec_ids, scores, top_k, books, seed_ids):
+        # books(ids) returns metadata for ids; the wider candidate list is cut down to top_k by kitab.rerank
+        import numpy as np
+        from kitab.rerank import rerank
+        rec_ids = list(rec_ids)
+        if len(rec_ids) <= 1:
+            return rec_ids[:top_k], scores[:top_k]
+        meta = books(rec_ids).drop_duplicates(subset=["id"]).set_index("id").reindex(rec_ids).reset_index()
+        vectors = model.similarity().matrix[[model.pos[vid] for vid in rec_ids]] if model is not None else None
+        keep = rerank(scores, vectors, meta, top_k, seeds=books(list(seed_ids)))
+        return [rec_ids[i] for i in keep], np.asarray(scores)[keep]
+
+    @metrics.stage("recommend")
+    def recommend(self, model, book_id, top_k, index=None, books=None):
+        from kitab.rerank import candidate_count
+        engine = model.similarity()
+        n = candidate_count(top_k) if books is not None else top_k
+        if index is not None:
+            rec_ids, scores = index.query(engine.matrix[model.pos[book_id]], n, exclude=[book_id],
+                                          exact_matrix=engine.matrix)
+        else:
+            indices, scores = engine.query([model.pos[book_id]], n)
+            rec_ids, scores = [model.ids[i] for i in indices[0]], scores[0]
+        if books is None:
+            return rec_ids, scores
+        return self._rerank(model, rec_ids, scores, top_k, books, [book_id])
+
+    @metrics.stage("recommend")
+    def recommend_for_profile(self, model, book_ids, top_k, mode="centroid", index=None, books=None):
+        from kitab.rerank import candidate_count
+        engine = model.similarity()
+        rows = [model.pos[vid] for vid in book_ids if vid in model.pos]
+        n = candidate_count(top_k) if books is not None else top_k
+        if index is not None and mode == "centroid":
+            profile = engine.matrix[rows].sum(axis=0)
+            rec_ids, scores = index.query(profile, n, exclude=book_ids, exact_matrix=engine.matrix)
+        else:
+            indices, scores = engine.query_profile(rows, n, mode=mode)
+            rec_ids = [model.ids[i] for i in indices]
+        if books is None:
+            return rec_ids, scores
+        return self._rerank(model, rec_ids, scores, top_k, books, [model.ids[row] for row in rows])
+
+    def recommend_for(self, ids, top_k=TOP_K, mode="centroid", query=None, rerank=True):
+        # Recommends from the whole catalog, or from the query's corpus plus the seeds when a query is given
+        ids = [str(vid) for vid in ids]
+        books = self.catalog.get if rerank else None
+        if not query and len(ids) == 1:
+            precomputed = self.more_like_this(ids[0], top_k, books)
+            if precomputed is not None:
+                rec_ids, scores = precomputed
+                return {"results": self._results(self.catalog.get(rec_ids), scores), "unknown": []}
+        if query:
+            import pandas as pd
+            frame = pd.concat([self.catalog.get(ids), self.corpus(query)], ignore_index=True)
+            frame = frame.drop_duplicates(subset=["id"], keep="first").reset_index(drop=True)
+            if len(frame) < 2:
+                return {"results": [], "unknown": ids}
+            model, index = self.model_for_frame(frame), None
+            positions = {vid: i for i, vid in enumerate(frame["id"].astype(str))}
+
+            def frame_books(wanted):
+                return frame.iloc[[positions[vid] for vid in wanted if vid in positions]]
+
+            books = frame_books if rerank else None
+        else:
+            frame = None
+            model = self.catalog_model()
+            index = self.catalog_index(model) if len(model.ids) > 1 else None
+
+        known = [vid for vid in ids if vid in model.pos]
+        unknown = [vid for vid in ids if vid not in model.pos]
+        if not known or len(model.ids) < 2:
+            return {"results": [], "unknown": unknown}
+        if len(known) == 1:
+            rec_ids, scores = self.recommend(model, known[0], top_k, index, books)
+        else:
+            rec_ids, scores = self.recommend_for_profile(model, known, top_k, mode, index, books)
+
+        if frame is not None:
+            books = frame.iloc[[positions[vid] for vid in rec_ids]]
+        else:
+            books = self.catalog.get(rec_ids)
+        return {"results": self._results(books, scores), "unknown": unknown}
+
+    @staticmethod
+    def _results(books, scores):
+        results = []
+        for record, score in zip(books[list(RESULT_COLUMNS)].to_dict(orient="records"), scores):
+            record = {key: _json_value(value) for key, value in record.items()}
+            record["score"] = round(float(score), 6)
+            results.append(record)
+        return results
+
+
+def _json_value(value):
+    from kitab.columnar import is_missing
+    if is_missing(value):
+        return None
+    return value.item() if hasattr(value, "item") else value
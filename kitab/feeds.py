@@ -0,0 +1,91 @@
+# Pre-warmed category feeds
+# A background worker fetches and parses every browse category at startup and on a schedule,
+# keeping the last good snapshot whenever a refresh fails and retrying only the categories that failed
+
+import logging
+import threading
+import time
+from dataclasses import dataclass
+
+import pandas as pd
+
+REFRESH_SECONDS = 3600
+RETRY_SECONDS = 60
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class FeedSnapshot:
+    name: str
+    df: pd.DataFrame
+    fetched_at: float
+
+
+class CategoryFeeds:
+    def __init__(self, categories, load, interval=REFRESH_SECONDS, retry=RETRY_SECONDS, warm=None):
+        # load(query) returns the feed's frame; warm(query, df), if given, runs after each good refresh
+        self.categories = dict(categories)
+        self.load = load
+        self.warm = warm
+        self.interval = interval
+        self.retry = retry
+        self.failures = 0
+        self._snapshots = {}
+        self._due = {}
+        self._delay = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def get(self, name):
+        with self._lock:
+            return self._snapshots.get(name)
+
+    def refresh(self, name):
+        try:
+            df = self.load(self.categories[name])
+        except Exception:
+            logger.exception("Refreshing category feed %r failed", name)
+            df = None
+        if df is None or df.empty:
+            self.failures += 1
+            return False
+
+        snapshot = FeedSnapshot(name, df, time.time())
+        with self._lock:
+            self._snapshots[name] = snapshot
+        if self.warm is not None:
+            try:
+                self.warm(self.categories[name], df)
+            except Exception:
+                logger.exception("Warming category feed %r failed", name)
+        return True
+
+    def refresh_due(self):
+        # Refreshes the categories whose turn has come and returns the seconds until the next one is due.
+        # A failing category backs off on its own, doubling from retry up to interval
+        for name in self.categories:
+            if self._due.get(name, 0) > time.time():
+                continue
+            if self.refresh(name):
+                self._delay.pop(name, None)
+                delay = self.interval
+            else:
+                previous = self._delay.get(name)
+                delay = self._delay[name] = self.retry if previous is None else min(2 * previous, self.interval)
+            self._due[name] = time.time() + delay
+        return max(0.0, min(self._due.values(), default=time.time() + self.interval) - time.time())
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._stop.wait(self.refresh_due())
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="kitab-category-feeds", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
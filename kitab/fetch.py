@@ -0,0 +1,282 @@
+# Google Books API client
+# Pooled keep-alive session, cached single-page fetches and parallel paginated fetches.
+# Identical concurrent fetches share one request, every request passes a global concurrency limit and a token
+# bucket sized under the API quota, 429/5xx responses are retried with jittered backoff, and stale cache
+# entries are served while a background refresh runs
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from kitab import metrics
+from kitab.cache import cache_key
+from kitab.shared import SingleFlight
+
+GOOGLE_BOOKS_URL = "https://www.googleapis.com/books/v1/volumes"
+PAGE_SIZE = 40
+POOL_SIZE = 16
+REQUEST_TIMEOUT = 10
+MAX_CONCURRENT = 8
+RATE_PER_SECOND = 5.0
+# Two full 400-book corpora (10 pages each) go out at once; the rate only paces sustained traffic
+BURST = 20
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+_session = None
+_executor = None
+_lock = threading.Lock()
+_flight = SingleFlight()
+_refreshing = set()
+
+logger = logging.getLogger(__name__)
+_fetch_stage = metrics.stage("fetch")
+_decode_stage = metrics.stage("decode")
+
+
+class RateLimited(requests.RequestException):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, rate=RATE_PER_SECOND, capacity=BURST):
+        self.rate = rate
+        self.capacity = capacity
+        self.waited = 0.0
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, timeout=None):
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            if deadline is not None and now + wait > deadline:
+                return False
+            self.waited += wait
+            time.sleep(wait)
+
+
+_bucket = TokenBucket()
+_slots = threading.BoundedSemaphore(MAX_CONCURRENT)
+_retries = 0
+_stale_served = 0
+
+
+def configure(max_concurrent=None, rate=None, burst=None):
+    # Limits are process-wide because the quota is shared by every session of the app
+    global _bucket, _slots
+    with _lock:
+        if rate is not None or burst is not None:
+            _bucket = TokenBucket(rate or _bucket.rate, burst or _bucket.capacity)
+        if max_concurrent is not None:
+            _slots = threading.BoundedSemaphore(max_concurrent)
+
+
+def stats():
+    return {"coalesced": _flight.coalesced, "in_flight": _flight.in_flight(), "retries": _retries,
+            "stale_served": _stale_served, "refreshing": len(_refreshing),
+            "throttled_seconds": round(_bucket.waited, 3)}
+
+
+def make_session(pool_size: int = POOL_SIZE):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_session():
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                _session = make_session()
+    return _session
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=POOL_SIZE, thread_name_prefix="kitab-fetch")
+    return _executor
+
+
+def _backoff(attempt, retry_after=None):
+    # Full jitter keeps retries from many sessions from arriving in lockstep; Retry-After is a lower bound
+    delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+def _retryable(exc):
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError)):
+        return True
+    response = getattr(exc, "response", None)
+    return response is not None and response.status_code in RETRY_STATUSES
+
+
+def request_page(query: str, max_results: int = PAGE_SIZE, start_index: int = 0, session=None,
+                 url=GOOGLE_BOOKS_URL):
+    global _retries
+    session = session or get_session()
+    params = {"q": query, "maxResults": max_results}
+    if start_index:
+        params["startIndex"] = start_index
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            return _request_once(session, url, params)
+        except (requests.RequestException, ValueError) as exc:
+            if attempt == MAX_RETRIES or not _retryable(exc):
+                raise
+            response = getattr(exc, "response", None)
+            delay = _backoff(attempt, response.headers.get("Retry-After") if response is not None else None)
+            if delay > BACKOFF_MAX:
+                raise
+            _retries += 1
+            metrics.counter("kitab_api_retries_total", "Books API requests retried after a failure",
+                            reason=response.status_code if response is not None else type(exc).__name__).inc()
+            time.sleep(delay)
+
+
+def _request_once(session, url, params):
+    if not _bucket.acquire(timeout=REQUEST_TIMEOUT):
+        metrics.counter("kitab_api_throttled_total", "Books API requests refused by the local rate limit").inc()
+        raise RateLimited("Local Books API rate limit exceeded")
+    start, status, items = time.perf_counter(), None, None
+    try:
+        with _slots, _fetch_stage:
+            res = session.get(url, params=params, timeout=REQUEST_TIMEOUT)
+        status = res.status_code
+        res.raise_for_status()
+        with _decode_stage:
+            items = res.json().get("items", [])
+        return items
+    except requests.Timeout:
+        status = "timeout"
+        metrics.counter("kitab_api_timeouts_total", "Books API requests that timed out").inc()
+        raise
+    except (requests.RequestException, ValueError) as exc:
+        metrics.counter("kitab_api_errors_total", "Failed Books API requests by error type",
+                        error=type(exc).__name__).inc()
+        raise
+    finally:
+        metrics.counter("kitab_api_requests_total", "Books API requests by HTTP status",
+                        status=status if status is not None else "error").inc()
+        metrics.log_event(logger, "books_api_request", logging.INFO if items is not None else logging.WARNING,
+                          query=params["q"], start_index=params.get("startIndex", 0),
+                          max_results=params["maxResults"], status=status,
+                          items=len(items) if items is not None else None,
+                          elapsed_ms=round((time.perf_counter() - start) * 1e3, 1))
+
+
+def _fetch_and_store(query, max_results, start_index, session, cache, url):
+    key = cache_key(query, max_results, start_index)
+
+    # Sessions asking for the same page at the same time wait on a single request
+    def fetch():
+        items = request_page(query, max_results, start_index, session=session, url=url)
+        if cache is not None:
+            cache.put(key, items)
+        return items
+
+    return _flight.do((url, key), fetch)
+
+
+def _refresh(query, max_results, start_index, session, cache, url):
+    flight_key = (url, cache_key(query, max_results, start_index))
+    with _lock:
+        if flight_key in _refreshing:
+            return
+        _refreshing.add(flight_key)
+
+    def run():
+        try:
+            _fetch_and_store(query, max_results, start_index, session, cache, url)
+        except (requests.RequestException, ValueError) as exc:
+            metrics.log_event(logger, "books_refresh_failed", logging.WARNING, query=query,
+                              start_index=start_index, error=type(exc).__name__, detail=str(exc))
+        finally:
+            with _lock:
+                _refreshing.discard(flight_key)
+
+    _get_executor().submit(run)
+
+
+def _serve_stale(items, query):
+    global _stale_served
+    _stale_served += 1
+    metrics.counter("kitab_api_stale_served_total", "Stale cached Books API pages served while refreshing").inc()
+    metrics.log_event(logger, "books_stale_served", logging.INFO, query=query)
+    return items
+
+
+def fetch_page(query: str, max_results: int = PAGE_SIZE, start_index: int = 0, session=None, cache=None,
+               url=GOOGLE_BOOKS_URL):
+    if cache is not None:
+        items, fresh = cache.lookup(cache_key(query, max_results, start_index))
+        if fresh:
+            return items
+        if items is not None:
+            # Stale-while-revalidate: answer now and let one background request bring the entry up to date
+            _refresh(query, max_results, start_index, session, cache, url)
+            return _serve_stale(items, query)
+    return _fetch_and_store(query, max_results, start_index, session, cache, url)
+
+
+def fetch_books(query: str, max_results: int = PAGE_SIZE, session=None, cache=None, url=GOOGLE_BOOKS_URL):
+    try:
+        return fetch_page(query, max_results, session=session, cache=cache, url=url)
+    except (requests.RequestException, ValueError) as exc:
+        # The UI shows an empty result either way; the failure itself is logged and counted
+        metrics.log_event(logger, "books_fetch_failed", logging.WARNING, query=query, error=type(exc).__name__,
+                          detail=str(exc))
+        return []
+
+
+def fetch_books_paged(query: str, total: int = 400, page_size: int = PAGE_SIZE, session=None, cache=None,
+                      url=GOOGLE_BOOKS_URL):
+    session = session or get_session()
+    starts = list(range(0, total, page_size))
+    futures = [
+        _get_executor().submit(fetch_page, query, min(page_size, total - start), start, session, cache, url)
+        for start in starts
+    ]
+
+    items, seen = [], set()
+    for start, future in zip(starts, futures):
+        try:
+            page = future.result()
+        except (requests.RequestException, ValueError) as exc:
+            metrics.log_event(logger, "books_page_skipped", logging.WARNING, query=query, start_index=start,
+                              error=type(exc).__name__, detail=str(exc))
+            continue
+        for item in page:
+            vid = item.get("id")
+            if vid is not None:
+                if vid in seen:
+                    continue
+                seen.add(vid)
+            items.append(item)
+    return items
@@ -0,0 +1,254 @@
+# Bulk catalog import
+# Streams JSONL dumps of Books API volume items (or whole API responses) and CSV exports in fixed-size chunks.
+# Worker processes parse, normalize, de-duplicate and, in hashing mode, vectorize each chunk while the parent
+# writes it to the catalog; a checkpoint after every chunk lets an interrupted import resume where it stopped
+
+import io
+import json
+import os
+import shutil
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from kitab.catalog import COLUMNS
+
+CHUNK_ROWS = 5000
+CHECKPOINT = "ingest.json"
+PARTS_DIR = "ingest-parts"
+FORMATS = ("jsonl", "csv")
+
+
+def detect_format(path):
+    name = path.lower()
+    for suffix in (".gz", ".bz2", ".xz"):
+        if name.endswith(suffix):
+            raise ValueError(f"Compressed dumps are not supported, decompress {path} first")
+    return "csv" if name.endswith(".csv") else "jsonl"
+
+
+def _records(fh, fmt):
+    # Yields (raw record bytes, end offset). A CSV record only ends on a line with balanced quotes, so quoted
+    # descriptions spanning several lines stay in one record
+    pending, quotes = [], 0
+    for line in iter(fh.readline, b""):
+        if fmt == "jsonl":
+            yield line, fh.tell()
+            continue
+        pending.append(line)
+        quotes += line.count(b'"')
+        if quotes % 2 == 0:
+            yield b"".join(pending), fh.tell()
+            pending, quotes = [], 0
+    if pending:
+        yield b"".join(pending), fh.tell()
+
+
+def read_chunks(path, fmt, offset=0, chunk_rows=CHUNK_ROWS):
+    # Yields (header, records, end offset); offsets are byte positions, so a resumed import seeks straight there
+    with open(path, "rb") as fh:
+        header = b""
+        if fmt == "csv":
+            header = fh.readline()
+            offset = max(offset, fh.tell())
+        fh.seek(offset)
+        chunk = []
+        for record, end in _records(fh, fmt):
+            if record.strip():
+                chunk.append(record)
+            if len(chunk) >= chunk_rows:
+                yield header, chunk, end
+                chunk = []
+        if chunk:
+            yield header, chunk, fh.tell()
+
+
+def _volume_items(lines):
+    items, bad = [], 0
+    for line in lines:
+        try:
+            obj = json.loads(line)
+        except ValueError:
+            bad += 1
+            continue
+        # A line may hold one volume or a whole saved API response
+        batch = obj.get("items", []) if isinstance(obj, dict) and "volumeInfo" not in obj else [obj]
+        for item in batch:
+            if isinstance(item, dict) and item.get("id"):
+                items.append(item)
+            else:
+                bad += 1
+    return items, bad
+
+
+def _csv_frame(header, records):
+    df = pd.read_csv(io.BytesIO(header + b"".join(records)), dtype=str, keep_default_na=False,
+                     on_bad_lines="skip")
+    df.columns = [str(col).strip().lower() for col in df.columns]
+    for col in COLUMNS:
+        if col not in df:
+            df[col] = ""
+    df = df[COLUMNS]
+    df["page_count"] = pd.to_numeric(df["page_count"], errors="coerce").astype("Int32")
+    df["rating"] = pd.to_numeric(df["rating"], errors="coerce").astype("Float32")
+    # Malformed lines were skipped by the parser; rows without an id cannot be stored
+    df = df[df["id"].str.strip() != ""]
+    return df, len(records) - len(df)
+
+
+def parse_chunk(task):
+    from kitab.columnar import parse_volumes
+    from kitab.vectorize import build_text, hashing_vectorizer
+
+    fmt, header, records, vectorize = task
+    if fmt == "jsonl":
+        items, bad = _volume_items(records)
+        df = parse_volumes(items)
+    else:
+        df, bad = _csv_frame(header, records)
+    if df.empty:
+        return df, None, bad, 0
+    rows = len(df)
+    df = df.drop_duplicates(subset=["id"], keep="last").reset_index(drop=True)
+    counts = hashing_vectorizer().transform(build_text(df)).tocsr().astype(np.float32) if vectorize else None
+    return df, counts, bad, rows - len(df)
+
+
+class Checkpoint:
+    def __init__(self, directory, source, fmt, mode):
+        self.path = os.path.join(directory, CHECKPOINT)
+        self.parts = os.path.join(directory, PARTS_DIR)
+        stat = os.stat(source)
+        self.source = {"path": os.path.abspath(source), "size": stat.st_size, "mtime": stat.st_mtime,
+                       "format": fmt, "mode": mode}
+        self.state = {"offset": 0, "chunks": 0, "rows": 0, "written": 0, "duplicates": 0, "bad": 0}
+
+    def resume(self):
+        # Only an unfinished import of the very same file (and vectorizer) is picked up again
+        try:
+            with open(self.path) as fh:
+                saved = json.load(fh)
+        except (OSError, ValueError):
+            return False
+        if saved.get("source") != self.source or saved.get("done"):
+            return False
+        self.state = saved["state"]
+        return True
+
+    def reset(self):
+        shutil.rmtree(self.parts, ignore_errors=True)
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def save(self, done=False):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"source": self.source, "state": self.state, "done": done, "updated": time.time()}, fh)
+        os.replace(tmp, self.path)
+
+    def part_path(self, chunk):
+        return os.path.join(self.parts, f"part-{chunk:07d}.npz")
+
+    def save_part(self, chunk, ids, counts):
+        os.makedirs(self.parts, exist_ok=True)
+        path = self.part_path(chunk)
+        np.savez(path + ".tmp.npz", ids=np.asarray(ids, dtype=str), data=counts.data, indices=counts.indices,
+                 indptr=counts.indptr, shape=np.asarray(counts.shape))
+        os.replace(path + ".tmp.npz", path)
+
+    def load_parts(self):
+        for chunk in range(self.state["chunks"]):
+            path = self.part_path(chunk)
+            if os.path.exists(path):
+                with np.load(path) as data:
+                    yield data["ids"].tolist(), sp.csr_matrix((data["data"], data["indices"], data["indptr"]),
+                                                              shape=tuple(data["shape"]))
+
+
+def _merge_counts(parts):
+    # Later rows win, matching the catalog upsert
+    ids, matrices = [], []
+    for part_ids, counts in parts:
+        ids.extend(part_ids)
+        matrices.append(counts)
+    if not ids:
+        return [], None
+    last = {vid: row for row, vid in enumerate(ids)}
+    keep = np.fromiter(sorted(last.values()), dtype=np.int64, count=len(last))
+    counts = sp.vstack(matrices, format="csr")
+    return [ids[row] for row in keep], counts[keep]
+
+
+def _save_model(engine, checkpoint):
+    from kitab.vectorize import TfidfModel
+    path = engine.saved_model_path()
+    parts = list(checkpoint.load_parts())
+    if os.path.exists(path):
+        existing = TfidfModel.load(path)
+        if existing.mode == "hashing":
+            parts.insert(0, (existing.ids, existing.counts))
+    ids, counts = _merge_counts(parts)
+    if ids:
+        TfidfModel.from_counts(ids, counts).save(path)
+    return len(ids)
+
+
+def run(engine, source, fmt=None, workers=None, chunk_rows=CHUNK_ROWS, restart=False, progress=None):
+    fmt = fmt or detect_format(source)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown import format: {fmt}")
+    vectorize = engine.vectorizer_mode == "hashing"
+    os.makedirs(engine.data_dir, exist_ok=True)
+    checkpoint = Checkpoint(engine.data_dir, source, fmt, engine.vectorizer_mode)
+    if restart or not checkpoint.resume():
+        checkpoint.reset()
+    state = checkpoint.state
+    resumed_from = state["offset"]
+    total = checkpoint.source["size"]
+    workers = workers or os.cpu_count() or 1
+    started = time.time()
+
+    def committed(result, end):
+        df, counts, bad, duplicates = result
+        if not df.empty:
+            engine.catalog.upsert(df)
+            if counts is not None:
+                checkpoint.save_part(state["chunks"], df["id"].astype(str).tolist(), counts)
+        state["chunks"] += 1
+        state["offset"] = end
+        state["rows"] += len(df) + duplicates + bad
+        state["written"] += len(df)
+        state["duplicates"] += duplicates
+        state["bad"] += bad
+        checkpoint.save()
+        if progress is not None:
+            progress(end, total, state["written"])
+
+    chunks = read_chunks(source, fmt, state["offset"], chunk_rows)
+    if workers <= 1:
+        for header, records, end in chunks:
+            committed(parse_chunk((fmt, header, records, vectorize)), end)
+    else:
+        # At most two chunks per worker are in flight, which bounds memory regardless of the dump size;
+        # results are committed in file order so the checkpoint offset only ever moves forward
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn")) as pool:
+            pending = deque()
+            for header, records, end in chunks:
+                pending.append((pool.submit(parse_chunk, (fmt, header, records, vectorize)), end))
+                if len(pending) >= 2 * workers:
+                    future, chunk_end = pending.popleft()
+                    committed(future.result(), chunk_end)
+            while pending:
+                future, chunk_end = pending.popleft()
+                committed(future.result(), chunk_end)
+
+    vectors = _save_model(engine, checkpoint) if vectorize else 0
+    checkpoint.save(done=True)
+    shutil.rmtree(checkpoint.parts, ignore_errors=True)
+    return {"source": checkpoint.source["path"], "format": fmt, "resumed_from": resumed_from, **state,
+            "vectorized": vectors, "catalog": engine.catalog.count(), "seconds": round(time.time() - started, 3)}
@@ -0,0 +1,141 @@
+# Liked-books collections
+# Insertion-ordered, keyed by volume id, and written through to a per-user SQLite table. In memory a collection is
+# only ids; the shared book table holds the books themselves. Visitors without a sign-in can be given a guest
+# identity: a random id signed with a server secret, so it cannot be guessed or forged to open someone else's likes
+
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from kitab.books import BookTable
+
+
+GUEST_PREFIX = "guest:"
+
+
+def _signature(secret, guest):
+    digest = hmac.new(secret.encode("utf-8"), guest.encode("utf-8"), hashlib.sha256).digest()[:16]
+    return base64.urlsafe_b64encode(digest).decode("ascii").rstrip("=")
+
+
+def new_guest_token(secret):
+    guest = secrets.token_urlsafe(16)
+    return f"{guest}.{_signature(secret, guest)}"
+
+
+def guest_user(secret, token):
+    # The likes-store user for a token, or None when it was not signed with secret
+    guest, _, signature = (token or "").partition(".")
+    if not guest or not signature or not hmac.compare_digest(signature, _signature(secret, guest)):
+        return None
+    return GUEST_PREFIX + guest
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class LikesStore:
+    def __init__(self, path, table=None):
+        self.path = path
+        self.table = table if table is not None else BookTable()
+        self._lock = threading.Lock()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS liked (
+                user TEXT NOT NULL,
+                id TEXT NOT NULL,
+                position INTEGER NOT NULL,
+                book TEXT NOT NULL,
+                added REAL NOT NULL,
+                PRIMARY KEY (user, id)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS liked_position ON liked (user, position)")
+
+    def load(self, user):
+        with self._lock:
+            rows = self._conn.execute("SELECT id, book, position FROM liked WHERE user = ? ORDER BY position",
+                                      (user,)).fetchall()
+        self.table.add_records(json.loads(book) for _, book, _ in rows)
+        books = OrderedDict((vid, None) for vid, _, _ in rows)
+        next_position = rows[-1][2] + 1 if rows else 0
+        return LikedBooks(self, user, books, next_position, self.table)
+
+    def _insert(self, user, vid, position, book):
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO liked (user, id, position, book, added) VALUES (?, ?, ?, ?, ?)",
+                               (user, vid, position, json.dumps(book, default=_json_default), time.time()))
+
+    def _delete(self, user, vid):
+        with self._lock:
+            self._conn.execute("DELETE FROM liked WHERE user = ? AND id = ?", (user, vid))
+
+
+class LikedBooks:
+    def __init__(self, store=None, user="guest", books=None, next_position=0, table=None):
+        self.store = store
+        self.user = user
+        self.table = table if table is not None else store.table if store is not None else BookTable()
+        # Insertion-ordered volume ids
+        self._books = books if books is not None else OrderedDict()
+        self._next_position = next_position
+
+    def __len__(self):
+        return len(self._books)
+
+    def __bool__(self):
+        return bool(self._books)
+
+    def __contains__(self, vid):
+        return vid in self._books
+
+    def __iter__(self):
+        return iter(self.frame().to_dict(orient="records"))
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self._books) + sum(sys.getsizeof(vid) for vid in self._books)
+
+    def ids(self):
+        return list(self._books)
+
+    def refs(self):
+        return self.table.refs(self._books)
+
+    def frame(self):
+        return self.table.frame(self.refs())
+
+    def add(self, book):
+        vid = str(book["id"])
+        if vid in self._books:
+            return False
+        self.table.add_records([book])
+        self._books[vid] = None
+        if self.store is not None:
+            self.store._insert(self.user, vid, self._next_position, book)
+        self._next_position += 1
+        return True
+
+    def remove(self, vid):
+        if vid not in self._books:
+            return False
+        del self._books[vid]
+        if self.store is not None:
+            self.store._delete(self.user, vid)
+        return True
@@ -0,0 +1,241 @@
+# Process metrics
+# Low-overhead counters, gauges and fixed-bucket histograms keyed by name and labels, a stage timer for the
+# hot path, and a Prometheus text export
+
+import bisect
+import logging
+import math
+import threading
+import time
+from contextlib import ContextDecorator
+
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+STAGE_SECONDS = "kitab_stage_seconds"
+STAGES = ("fetch", "decode", "parse", "vectorize", "index", "match", "search", "recommend", "rerank", "render")
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    kind = "gauge"
+
+    def __init__(self):
+        self.value = 0
+
+    def set(self, value):
+        self.value = value
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def percentile(self, q):
+        # Linear interpolation inside the bucket holding the q-th observation
+        with self._lock:
+            counts, total = list(self.counts), self.count
+        if not total:
+            return math.nan
+        rank, seen = q * total, 0
+        for i, n in enumerate(counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / n
+            seen += n
+        return self.buckets[-1]
+
+
+def _label_value(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_label_value(v)}"' for k, v in labels) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._help = {}
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def _get(self, cls, name, help, labels):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._metrics.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._metrics.get(key)
+                if metric is None:
+                    metric = self._metrics[key] = cls()
+                    self._help.setdefault(name, (cls.kind, help))
+        return metric
+
+    def counter(self, name, help="", **labels):
+        return self._get(Counter, name, help, labels)
+
+    def gauge(self, name, help="", **labels):
+        return self._get(Gauge, name, help, labels)
+
+    def histogram(self, name, help="", **labels):
+        return self._get(Histogram, name, help, labels)
+
+    def register_stats(self, component, stats):
+        # stats() returns a dict of numbers, exported as kitab_<component>_<key> gauges on every export
+        with self._lock:
+            self._stats[component] = stats
+
+    def samples(self):
+        with self._lock:
+            metrics = list(self._metrics.items())
+            stats = list(self._stats.items())
+        for component, fn in stats:
+            try:
+                values = fn()
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)):
+                    gauge = Gauge()
+                    gauge.set(value)
+                    metrics.append(((f"kitab_{component}_{key}", ()), gauge))
+        return sorted(metrics, key=lambda item: item[0])
+
+    def export(self):
+        lines, described = [], set()
+        for (name, labels), metric in self.samples():
+            if name not in described:
+                described.add(name)
+                kind, help = self._help.get(name, (metric.kind, ""))
+                if help:
+                    lines.append(f"# HELP {name} {help}")
+                lines.append(f"# TYPE {name} {kind}")
+            if isinstance(metric, Histogram):
+                cumulative = 0
+                for bound, n in zip(metric.buckets + (math.inf,), metric.counts):
+                    cumulative += n
+                    le = "+Inf" if bound == math.inf else repr(bound)
+                    lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+                lines.append(f"{name}_sum{_label_text(labels)} {metric.sum}")
+                lines.append(f"{name}_count{_label_text(labels)} {metric.count}")
+            else:
+                lines.append(f"{name}{_label_text(labels)} {metric.value}")
+        return "\n".join(lines) + "\n"
+
+    def total(self, name):
+        return sum(metric.value for (metric_name, _), metric in self.samples() if metric_name == name)
+
+    def stage_summary(self):
+        rows = []
+        for (name, labels), metric in self.samples():
+            if name == STAGE_SECONDS:
+                label = dict(labels)
+                rows.append({
+                    "stage": label.get("stage"),
+                    "count": metric.count,
+                    "total_s": metric.sum,
+                    "p50_ms": metric.percentile(0.5) * 1e3,
+                    "p90_ms": metric.percentile(0.9) * 1e3,
+                    "p99_ms": metric.percentile(0.99) * 1e3,
+                })
+        order = {stage: i for i, stage in enumerate(STAGES)}
+        return sorted(rows, key=lambda row: order.get(row["stage"], len(order)))
+
+    def hit_rates(self):
+        # Caches keep their own hits/misses counters and report them through register_stats
+        values = {name: metric.value for (name, labels), metric in self.samples() if not labels}
+        rates = {}
+        for component in list(self._stats):
+            hits, misses = values.get(f"kitab_{component}_hits"), values.get(f"kitab_{component}_misses")
+            if hits is not None and misses is not None and hits + misses:
+                rates[component] = hits / (hits + misses)
+        return rates
+
+    def clear(self):
+        with self._lock:
+            self._metrics.clear()
+
+
+REGISTRY = Registry()
+counter = REGISTRY.counter
+gauge = REGISTRY.gauge
+histogram = REGISTRY.histogram
+register_stats = REGISTRY.register_stats
+export = REGISTRY.export
+
+
+# Times a pipeline stage into kitab_stage_seconds{stage=name}, as a context manager or a decorator
+class stage(ContextDecorator):
+    def __init__(self, name, registry=REGISTRY):
+        self.histogram = registry.histogram(STAGE_SECONDS, "Wall time spent per pipeline stage", stage=name)
+        self._local = threading.local()
+
+    def __enter__(self):
+        starts = getattr(self._local, "starts", None)
+        if starts is None:
+            starts = self._local.starts = []
+        starts.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self._local.starts.pop())
+        return False
+
+
+# One key=value line per event; the fields are also attached to the record for structured handlers
+def log_event(logger, event, level=logging.INFO, **fields):
+    if logger.isEnabledFor(level):
+        text = " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                        for key, value in fields.items())
+        logger.log(level, "%s %s", event, text, extra={"event": event, "fields": fields})
+
+
+def serve(port, host="127.0.0.1", registry=REGISTRY):
+    # Imported here so that importing metrics stays cheap for the engine and CLI
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.export().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer((host, port), MetricsHandler)
+    httpd.daemon_threads = True
+    threading.Thread(target=httpd.serve_forever, name="kitab-metrics", daemon=True).start()
+    return httpd
@@ -0,0 +1,222 @@
+# Precomputed top-k neighbours
+# A batch job scores every catalog book against the whole catalog across a process pool and stores the
+# neighbours as memory-mapped int32 row / float16 score arrays; "more like this" is then a single row read.
+# Later runs only score the books added since, merging them into the existing rows
+
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+import scipy.sparse as sp
+
+from kitab.similarity import top_k
+
+K = 50
+CHUNK_BYTES = 64 * 1024 * 1024
+MIN_PARALLEL_ROWS = 20000
+META = "meta.json"
+ARRAYS = ("ids", "id_order", "indices", "scores")
+MATRIX_PARTS = ("data", "indices", "indptr")
+_worker = {}
+
+
+def _path(directory, name):
+    return os.path.join(directory, f"{name}.npy")
+
+
+def _save_matrix(directory, matrix):
+    if not sp.issparse(matrix):
+        np.save(_path(directory, "matrix_dense"), matrix)
+        return
+    for part in MATRIX_PARTS:
+        np.save(_path(directory, f"matrix_{part}"), getattr(matrix, part))
+
+
+def _load_matrix(directory, shape):
+    if os.path.exists(_path(directory, "matrix_dense")):
+        return np.load(_path(directory, "matrix_dense"), mmap_mode="r")
+    parts = [np.load(_path(directory, f"matrix_{part}"), mmap_mode="r") for part in MATRIX_PARTS]
+    return sp.csr_matrix(tuple(parts), shape=shape, copy=False)
+
+
+def _similarities(rows, columns):
+    sims = rows @ columns.T
+    return sims.toarray() if sp.issparse(sims) else np.asarray(sims, dtype=np.float32)
+
+
+def _init_worker(work_dir, shape, new_start):
+    _worker["matrix"] = _load_matrix(work_dir, shape)
+    _worker["indices"] = np.load(_path(work_dir, "indices"), mmap_mode="r+")
+    _worker["scores"] = np.load(_path(work_dir, "scores"), mmap_mode="r+")
+    _worker["new_start"] = new_start
+
+
+def _chunk(task):
+    kind, start, stop = task
+    matrix, indices, scores = _worker["matrix"], _worker["indices"], _worker["scores"]
+    k = indices.shape[1]
+    if kind == "full":
+        # New rows are scored against every row
+        sims = _similarities(matrix[start:stop], matrix)
+        sims[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+        idx, sc = top_k(sims, k)
+    else:
+        # Existing rows only need the new rows as extra candidates next to the neighbours they already have
+        new_start = _worker["new_start"]
+        sims = _similarities(matrix[start:stop], matrix[new_start:])
+        candidates = np.hstack([indices[start:stop], np.arange(new_start, matrix.shape[0])[None, :]
+                                .repeat(stop - start, axis=0)])
+        candidate_scores = np.hstack([scores[start:stop].astype(np.float32), sims])
+        candidate_scores[candidates < 0] = -np.inf
+        order, sc = top_k(candidate_scores, k)
+        idx = np.take_along_axis(candidates, order, axis=1)
+    idx = np.where(np.isfinite(sc), idx, -1)
+    indices[start:stop, :idx.shape[1]] = idx
+    scores[start:stop, :sc.shape[1]] = np.where(np.isfinite(sc), sc, 0)
+    return stop - start
+
+
+def _tasks(kind, start, stop, step):
+    return [(kind, a, min(a + step, stop)) for a in range(start, stop, step)]
+
+
+def _run(tasks, work_dir, shape, new_start, workers, progress):
+    done, total = 0, sum(stop - start for _, start, stop in tasks)
+    if workers <= 1:
+        _init_worker(work_dir, shape, new_start)
+        results = map(_chunk, tasks)
+        pool = None
+    else:
+        # Workers memory-map the matrix and the output arrays, so nothing large is pickled between processes
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                   initializer=_init_worker, initargs=(work_dir, shape, new_start))
+        results = pool.map(_chunk, tasks)
+    try:
+        for n in results:
+            done += n
+            if progress is not None:
+                progress(done, total)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        _worker.clear()
+
+
+def _kind(feature_key):
+    return (feature_key or "").split(":")[0]
+
+
+def _load_meta(directory):
+    try:
+        with open(os.path.join(directory, META)) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def build(matrix, ids, directory, k=K, workers=None, feature_key=None, full=False, progress=None):
+    if sp.issparse(matrix):
+        matrix = sp.csr_matrix(matrix, dtype=np.float32)
+    else:
+        matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+    ids = [str(vid) for vid in ids]
+    n = len(ids)
+    os.makedirs(directory, exist_ok=True)
+
+    meta = None if full else _load_meta(directory)
+    n_old = 0
+    # Rows from earlier runs keep the scores of the vocabulary they were computed with; only a change of
+    # vectorizer kind, k or id order forces a full run (as does full=True)
+    if meta and meta["k"] == k and _kind(meta["feature_key"]) == _kind(feature_key) and meta["size"] <= n:
+        old_ids = np.load(_path(directory, "ids"), mmap_mode="r")
+        if np.array_equal(old_ids, np.asarray(ids[:meta["size"]], dtype=old_ids.dtype)):
+            n_old = meta["size"]
+    if n_old == n:
+        return {"mode": "unchanged", "size": n, "computed": 0}
+
+    work_dir = os.path.join(directory, f"build-{os.getpid()}")
+    os.makedirs(work_dir, exist_ok=True)
+    started = time.time()
+    try:
+        _save_matrix(work_dir, matrix)
+        indices = np.lib.format.open_memmap(_path(work_dir, "indices"), mode="w+", dtype=np.int32, shape=(n, k))
+        scores = np.lib.format.open_memmap(_path(work_dir, "scores"), mode="w+", dtype=np.float16, shape=(n, k))
+        indices[:] = -1
+        scores[:] = 0
+        if n_old:
+            indices[:n_old] = np.load(_path(directory, "indices"), mmap_mode="r")
+            scores[:n_old] = np.load(_path(directory, "scores"), mmap_mode="r")
+        indices.flush()
+        scores.flush()
+        del indices, scores
+
+        # Each chunk materializes a dense (rows x n) score block, so the row count follows the catalog size
+        step = max(1, min(4096, CHUNK_BYTES // (4 * max(n, 1))))
+        merge_step = max(1, min(4096, CHUNK_BYTES // (4 * (n - n_old + k))))
+        tasks = _tasks("full", n_old, n, step) + _tasks("merge", 0, n_old, merge_step)
+        if workers is None:
+            workers = (os.cpu_count() or 1) if n - n_old >= MIN_PARALLEL_ROWS else 1
+        _run(tasks, work_dir, matrix.shape, n_old, workers, progress)
+
+        id_array = np.asarray(ids, dtype=f"S{max(len(v.encode('utf-8')) for v in ids) if ids else 1}")
+        np.save(_path(work_dir, "ids"), id_array)
+        np.save(_path(work_dir, "id_order"), np.argsort(id_array, kind="stable").astype(np.int32))
+        for name in ARRAYS:
+            os.replace(_path(work_dir, name), _path(directory, name))
+        with open(os.path.join(directory, META + ".tmp"), "w") as fh:
+            json.dump({"k": k, "size": n, "feature_key": feature_key, "built_at": time.time()}, fh)
+        os.replace(os.path.join(directory, META + ".tmp"), os.path.join(directory, META))
+    finally:
+        for name in os.listdir(work_dir):
+            os.remove(os.path.join(work_dir, name))
+        os.rmdir(work_dir)
+    return {"mode": "incremental" if n_old else "full", "size": n, "computed": n - n_old,
+            "seconds": round(time.time() - started, 3)}
+
+
+class NeighbourTable:
+    def __init__(self, directory):
+        self.directory = directory
+        self.meta = _load_meta(directory)
+        if self.meta is None:
+            raise FileNotFoundError(f"No neighbour table in {directory}")
+        self.ids = np.load(_path(directory, "ids"), mmap_mode="r")
+        self.id_order = np.load(_path(directory, "id_order"), mmap_mode="r")
+        self.indices = np.load(_path(directory, "indices"), mmap_mode="r")
+        self.scores = np.load(_path(directory, "scores"), mmap_mode="r")
+
+    @classmethod
+    def open(cls, directory):
+        try:
+            return cls(directory)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    @property
+    def size(self):
+        return self.meta["size"]
+
+    @property
+    def k(self):
+        return self.meta["k"]
+
+    def row_for_id(self, vid):
+        key = str(vid).encode("utf-8")
+        if len(key) > self.ids.dtype.itemsize:
+            return None
+        i = int(np.searchsorted(self.ids, key, sorter=self.id_order))
+        if i < len(self.id_order) and self.ids[self.id_order[i]] == key:
+            return int(self.id_order[i])
+        return None
+
+    def lookup(self, vid, k=None):
+        row = self.row_for_id(vid)
+        if row is None:
+            return None
+        k = min(k or self.k, self.k)
+        idx = self.indices[row, :k]
+        idx = idx[idx >= 0]
+        return [self.ids[i].decode("utf-8") for i in idx], self.scores[row, :len(idx)].astype(np.float32)
@@ -0,0 +1,120 @@
+# HTML rendering of book cards
+# Every card is one pre-built HTML fragment, generated column-wise over a DataFrame and cached per book id
+
+import math
+import threading
+from collections import OrderedDict
+
+import pandas as pd
+
+from kitab import metrics
+
+PAGE_SIZE = 10
+DESCRIPTION_CHARS = 280
+THUMBNAIL_WIDTH = 140
+CARD_CACHE_BYTES = 64 * 1024 * 1024
+PLACEHOLDER = '<div style="background: #333; width: 140px; height: 200px; border-radius: 8px;"></div>'
+
+
+def _escape(col):
+    return (col.astype(object).fillna("").astype(str)
+            .str.replace("&", "&amp;", regex=False)
+            .str.replace("<", "&lt;", regex=False)
+            .str.replace(">", "&gt;", regex=False)
+            .str.replace('"', "&quot;", regex=False))
+
+
+def _display(col):
+    values = col.astype(object)
+    missing = values.isna() | (values == "N/A")
+    numbers = pd.to_numeric(values.where(~missing), errors="coerce")
+    text = numbers.map(lambda v: f"{v:g}", na_action="ignore").astype(object)
+    text = text.where(numbers.notna(), values.astype(str))
+    return text.where(~missing, "N/A"), missing
+
+
+@metrics.stage("render")
+def card_html(df, images=None):
+    if df.empty:
+        return pd.Series([], dtype=object)
+
+    thumbnail = df["thumbnail"].astype(object)
+    if images is not None:
+        local = pd.Series(images, index=df.index, dtype=object)
+        thumbnail = local.where(local.notna(), thumbnail)
+    has_thumb = thumbnail.fillna("").astype(str) != ""
+    image = '<img src="' + _escape(thumbnail) + f'" width="{THUMBNAIL_WIDTH}" style="border-radius: 8px;">'
+    image = image.where(has_thumb, PLACEHOLDER)
+
+    rating, no_rating = _display(df["rating"])
+    rating_badge = ('<span class="badge">⭐ ' + rating + '/5</span>').where(~no_rating, "")
+    pages, _ = _display(df["page_count"])
+    published, _ = _display(df["published_date"])
+    description = _escape(df["description"].astype(object).fillna("").astype(str).str[:DESCRIPTION_CHARS])
+
+    return (
+            '<div class="book-card"><div style="display: flex; gap: 24px;">'
+            f'<div style="flex: 0 0 {THUMBNAIL_WIDTH}px;">' + image + '</div>'
+            '<div style="flex: 1;">'
+            '<h3 style="margin-top: 0;">' + _escape(df["title"]) + '</h3>'
+            '<span class="badge">📖 ' + _escape(df["authors"]) + '</span>' + rating_badge +
+            '<p style="color: #B0B8C1; font-size: 0.9rem;">' + _escape(published) + ' • Pages: ' + pages + '</p>'
+            '<p style="color: #B0B8C1; line-height: 1.6;">' + description + '...</p>'
+            '<p><span class="badge" style="background: #06D6A0;">' + _escape(df["categories"]) + '</span></p>'
+            '</div></div></div>'
+    )
+
+
+class CardCache:
+    # Cards embedding a local cover carry its base64 bytes, so the cache is bounded by size as well as count
+    def __init__(self, max_entries=5000, max_bytes=CARD_CACHE_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._cards = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def render(self, df, images=None):
+        ids = df["id"].astype(str).tolist()
+        with self._lock:
+            cached = {vid: self._cards[vid] for vid in ids if vid in self._cards}
+            for vid in cached:
+                self._cards.move_to_end(vid)
+
+        missing = [i for i, vid in enumerate(ids) if vid not in cached]
+        self.hits += len(ids) - len(missing)
+        self.misses += len(missing)
+        if missing:
+            subset = df.iloc[missing]
+            sources = images(subset) if images is not None else None
+            html = card_html(subset, sources).tolist()
+            fresh = dict(zip((ids[i] for i in missing), html))
+            cached.update(fresh)
+            # Cards whose local thumbnail was not ready yet fall back to the remote URL and are rebuilt next time
+            if sources is not None:
+                fresh = {ids[i]: card for i, card, src in zip(missing, html, sources) if src is not None}
+            with self._lock:
+                for vid, card in fresh.items():
+                    old = self._cards.pop(vid, None)
+                    if old is not None:
+                        self._bytes -= len(old)
+                    self._cards[vid] = card
+                    self._bytes += len(card)
+                while self._cards and (len(self._cards) > self.max_entries or self._bytes > self.max_bytes):
+                    _, evicted = self._cards.popitem(last=False)
+                    self._bytes -= len(evicted)
+        return [cached[vid] for vid in ids]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "entries": len(self._cards), "bytes": self._bytes}
+
+
+def page_count(n_items, page_size=PAGE_SIZE):
+    return max(1, math.ceil(n_items / page_size))
+
+
+def page_slice(page, n_items, page_size=PAGE_SIZE):
+    page = min(max(page, 1), page_count(n_items, page_size))
+    return slice((page - 1) * page_size, min(page * page_size, n_items))
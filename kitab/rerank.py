@@ -0,0 +1,121 @@
+# Re-ranking of recommendation candidates
+# A wider candidate set is scored in one pass on similarity, rating and recency, then picked greedily with MMR:
+# each pick updates the candidates' max similarity to the picks so far and penalizes further editions of the
+# same title and books by the same author, so the cost is one vector update per pick rather than pairwise loops
+
+import string
+import time
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+from kitab import metrics
+from kitab.columnar import MISSING
+
+CANDIDATES = 500
+CANDIDATE_FACTOR = 10
+SIMILARITY_WEIGHT = 1.0
+RATING_WEIGHT = 0.1
+RECENCY_WEIGHT = 0.05
+RECENCY_YEARS = 15.0
+DIVERSITY = 0.3
+EDITION_PENALTY = 0.5
+AUTHOR_PENALTY = 0.1
+
+_PUNCTUATION = str.maketrans({c: " " for c in string.punctuation})
+
+
+def candidate_count(top_k):
+    return min(CANDIDATES, max(top_k * CANDIDATE_FACTOR, top_k))
+
+
+def _strings(values):
+    values = values.tolist() if hasattr(values, "tolist") else list(values)
+    return [v if isinstance(v, str) and v != MISSING else "" for v in values]
+
+
+def title_key(title):
+    # Editions differ in subtitle, volume brackets and punctuation far more often than in the title itself
+    for mark in ":([":
+        title = title.partition(mark)[0]
+    return " ".join(title.lower().translate(_PUNCTUATION).split())
+
+
+def title_keys(titles):
+    return [title_key(t) for t in _strings(titles)]
+
+
+def author_keys(authors):
+    return [a.split(",")[0].strip().lower() or None for a in _strings(authors)]
+
+
+def _year(date):
+    return float(date[:4]) if date[:4].isdigit() else np.nan
+
+
+def quality(books):
+    rating = pd.to_numeric(books["rating"], errors="coerce").to_numpy(dtype=np.float32, na_value=np.nan)
+    rating = np.where(np.isnan(rating), 0.5, (rating - 1) / 4)
+    years = np.fromiter((_year(d) for d in _strings(books["published_date"])), dtype=np.float32, count=len(books))
+    age = np.clip(time.gmtime().tm_year - years, 0, None)
+    recency = np.where(np.isnan(age), 0.0, np.exp(-age / RECENCY_YEARS))
+    return (RATING_WEIGHT * rating + RECENCY_WEIGHT * recency).astype(np.float32)
+
+
+class _RowSimilarity:
+    # One mat-vec per pick. Sparse rows are scattered into a reused dense buffer and cleared again, which keeps
+    # each update O(nnz) even with 2^18 hashing features
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.sparse = sp.issparse(vectors)
+        if self.sparse:
+            self.vectors = sp.csr_matrix(vectors, dtype=np.float32)
+            self.buffer = np.zeros(vectors.shape[1], dtype=np.float32)
+
+    def __call__(self, j):
+        if not self.sparse:
+            return self.vectors @ self.vectors[j]
+        v = self.vectors
+        cols = v.indices[v.indptr[j]:v.indptr[j + 1]]
+        self.buffer[cols] = v.data[v.indptr[j]:v.indptr[j + 1]]
+        sims = v @ self.buffer
+        self.buffer[cols] = 0
+        return sims
+
+
+@metrics.stage("rerank")
+def rerank(similarity, vectors, books, k, seeds=None, diversity=DIVERSITY):
+    # similarity: candidate scores against the query; vectors: their normalized rows, or None when only the
+    # scores are known (precomputed neighbours); books: their metadata aligned by position; seeds: metadata of
+    # the books being recommended for. Returns the positions to keep, best first
+    similarity = np.asarray(similarity, dtype=np.float32)
+    n = len(similarity)
+    k = min(k, n)
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    relevance = SIMILARITY_WEIGHT * similarity + quality(books)
+
+    seed_titles = title_keys(seeds["title"]) if seeds is not None else []
+    titles, _ = pd.factorize(np.asarray(title_keys(books["title"]) + seed_titles, dtype=object))
+    authors, _ = pd.factorize(np.asarray(author_keys(books["authors"]), dtype=object))
+    titles, seed_codes = titles[:n], titles[n:]
+
+    # Other editions of the seed books would only be recommending what the user already has
+    score = (1 - diversity) * relevance
+    score[np.isin(titles, seed_codes)] -= EDITION_PENALTY
+    similarity_to = _RowSimilarity(vectors) if vectors is not None else None
+    max_sim = np.zeros(n, dtype=np.float32)
+    mmr = np.empty(n, dtype=np.float32)
+    picked = np.empty(k, dtype=np.int64)
+    for i in range(k):
+        np.subtract(score, max_sim, out=mmr)
+        j = int(np.argmax(mmr))
+        picked[i] = j
+        score[j] = -np.inf
+        if similarity_to is not None:
+            np.maximum(max_sim, diversity * similarity_to(j), out=max_sim)
+        np.subtract(score, EDITION_PENALTY, out=score, where=titles == titles[j])
+        if authors[j] >= 0:
+            np.subtract(score, AUTHOR_PENALTY, out=score, where=authors == authors[j])
+    return picked
@@ -0,0 +1,167 @@
+# Local full-text search over the catalog
+# Inverted index of title/author/description/category words with BM25 ranking. The last word of a query is
+# also matched as a prefix, so results can follow the user while they type
+
+import bisect
+import re
+import threading
+from array import array
+
+import numpy as np
+
+from kitab import metrics
+from kitab.similarity import top_k
+
+_WORD = re.compile(r"\w+")
+K1 = 1.2
+B = 0.75
+MAX_PREFIX_TERMS = 64
+MIN_PREFIX_LENGTH = 2
+
+
+def tokenize(text):
+    return _WORD.findall(str(text).lower())
+
+
+class SearchIndex:
+    def __init__(self):
+        self.ids = []
+        self.pos = {}
+        self._lengths = array("I")
+        self._norm = None
+        self._total_length = 0
+        self._rows = {}
+        self._freqs = {}
+        self._frozen = {}
+        self._terms = []
+        self._terms_dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, texts):
+        # Books already indexed are skipped; catalog text rarely changes once a volume has been seen
+        added = 0
+        with self._lock:
+            for vid, text in zip(ids, texts):
+                if vid in self.pos:
+                    continue
+                row = len(self.ids)
+                self.pos[vid] = row
+                self.ids.append(vid)
+                tokens = tokenize(text)
+                self._lengths.append(len(tokens))
+                self._total_length += len(tokens)
+                self._norm = None
+                counts = {}
+                for token in tokens:
+                    counts[token] = counts.get(token, 0) + 1
+                for term, tf in counts.items():
+                    rows = self._rows.get(term)
+                    if rows is None:
+                        rows = self._rows[term] = array("I")
+                        self._freqs[term] = array("H")
+                        self._terms_dirty = True
+                    rows.append(row)
+                    self._freqs[term].append(min(tf, 65535))
+                    self._frozen.pop(term, None)
+                added += 1
+        return added
+
+    def _posting(self, term):
+        # Postings grow in place as books are added, so searches read frozen numpy copies
+        entry = self._frozen.get(term)
+        if entry is None:
+            with self._lock:
+                entry = self._frozen[term] = (np.array(self._rows[term], dtype=np.int32),
+                                              np.array(self._freqs[term], dtype=np.float32))
+        return entry
+
+    def _length_norm(self):
+        norm = self._norm
+        if norm is None:
+            with self._lock:
+                lengths = np.array(self._lengths, dtype=np.float32)
+                norm = self._norm = K1 * (1 - B + B * lengths / max(self._total_length / max(len(lengths), 1), 1))
+        return norm
+
+    def _expand(self, prefix):
+        with self._lock:
+            if self._terms_dirty:
+                self._terms = sorted(self._rows)
+                self._terms_dirty = False
+            terms = self._terms
+        start = bisect.bisect_left(terms, prefix)
+        stop = bisect.bisect_left(terms, prefix + "\uffff")
+        matches = terms[start:stop]
+        if len(matches) > MAX_PREFIX_TERMS:
+            # Common completions carry the results; rare ones would only add noise and cost
+            matches = sorted(matches, key=lambda t: -len(self._rows[t]))[:MAX_PREFIX_TERMS]
+        return matches
+
+    def _groups(self, query, prefix):
+        # One group of index terms per distinct query word, plus the number of query words; words the index
+        # has never seen get no group
+        tokens = tokenize(query)
+        complete = tokens[:-1] if prefix and not query[-1:].isspace() else tokens
+        words = list(dict.fromkeys(complete))
+        groups = [[t] for t in words if t in self._rows]
+        if len(complete) < len(tokens):
+            last = tokens[-1]
+            if last not in words:
+                words.append(last)
+            if len(last) >= MIN_PREFIX_LENGTH:
+                expanded = self._expand(last)
+            else:
+                expanded = [last] if last in self._rows else []
+            if expanded:
+                groups.append(expanded)
+        return groups, len(words)
+
+    @metrics.stage("search")
+    def search(self, query, n=10, prefix=True):
+        if not self.ids:
+            return []
+        groups, _ = self._groups(query, prefix)
+        if not groups:
+            return []
+
+        norm = self._length_norm()
+        size = len(norm)
+        scores = np.zeros(size, dtype=np.float32)
+        for group in groups:
+            # A prefix counts once per book, through its best-scoring completion
+            best = np.zeros(size, dtype=np.float32) if len(group) > 1 else scores
+            for term in group:
+                rows, tf = self._posting(term)
+                if len(rows) and rows[-1] >= size:
+                    keep = rows < size
+                    rows, tf = rows[keep], tf[keep]
+                idf = np.log1p((size - len(rows) + 0.5) / (len(rows) + 0.5))
+                contribution = idf * tf * (K1 + 1) / (tf + norm[rows])
+                if best is scores:
+                    scores[rows] += contribution
+                else:
+                    best[rows] = np.maximum(best[rows], contribution)
+            if best is not scores:
+                scores += best
+
+        matched = np.flatnonzero(scores)
+        if len(matched) == 0:
+            return []
+        idx, sc = top_k(scores[matched][None, :], n)
+        return [(int(matched[i]), float(s)) for i, s in zip(idx[0], sc[0])]
+
+    def coverage(self, query, rows, prefix=True):
+        # Fraction of the query's words each row matches, so a caller can tell full matches from books that
+        # only share one common word with the query
+        rows = np.asarray(rows, dtype=np.int32)
+        groups, n_words = self._groups(query, prefix)
+        matched = np.zeros(len(rows), dtype=np.float32)
+        for group in groups:
+            matched += np.isin(rows, np.concatenate([self._posting(term)[0] for term in group]))
+        return np.minimum(matched / max(n_words, 1), 1.0)
+
+    def stats(self):
+        return {"books": len(self.ids), "terms": len(self._rows)}
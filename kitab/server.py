@@ -0,0 +1,151 @@
+# Local HTTP JSON endpoint
+# A thin stdlib server around one long-lived Engine, so other services get recommendations without Streamlit
+#
+#   GET  /health
+#   GET  /search?q=dune&n=10[&local=1]
+#   GET  /recommend?ids=a,b&k=10&mode=centroid[&query=...][&rerank=0]
+#   POST /recommend  {"ids": [...], "k": 10, "mode": "centroid", "query": null, "rerank": true}
+#   GET  /metrics
+
+import json
+import logging
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from kitab import metrics
+from kitab.engine import SEARCH_RESULTS
+
+HOST = "127.0.0.1"
+PORT = 8500
+MAX_BODY = 1024 * 1024
+MAX_TOP_K = 100
+MODES = ("centroid", "max")
+
+logger = logging.getLogger(__name__)
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _recommend_args(data):
+    ids = data.get("ids") or []
+    if isinstance(ids, str):
+        ids = [vid for vid in ids.split(",") if vid]
+    if not isinstance(ids, list) or not all(isinstance(vid, str) for vid in ids):
+        raise BadRequest("ids must be a list of strings")
+    if not ids:
+        raise BadRequest("ids is required")
+    try:
+        top_k = int(data.get("k", 10))
+    except (TypeError, ValueError):
+        raise BadRequest("k must be an integer")
+    mode = data.get("mode", "centroid")
+    if mode not in MODES:
+        raise BadRequest(f"mode must be one of {', '.join(MODES)}")
+    rerank = data.get("rerank", True)
+    if isinstance(rerank, str):
+        rerank = rerank.lower() not in ("0", "false", "no")
+    return ids, min(max(top_k, 1), MAX_TOP_K), mode, data.get("query") or None, bool(rerank)
+
+
+def _search_args(data):
+    query = data.get("q")
+    if not query:
+        raise BadRequest("q is required")
+    try:
+        n = int(data.get("n", 10))
+    except (TypeError, ValueError):
+        raise BadRequest("n must be an integer")
+    # The Books API rejects pages larger than SEARCH_RESULTS
+    return query, min(max(n, 1), SEARCH_RESULTS), str(data.get("local", "")).lower() in ("1", "true")
+
+
+class EngineHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self._dispatch(url.path, params)
+
+    def do_POST(self):
+        url = urlparse(self.path)
+        length = int(self.headers.get("Content-Length") or 0)
+        if length > MAX_BODY:
+            self._send_json(413, {"error": "request body too large"})
+            return
+        try:
+            data = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send_json(400, {"error": "body must be JSON"})
+            return
+        self._dispatch(url.path, data if isinstance(data, dict) else {})
+
+    def _dispatch(self, path, data):
+        engine = self.server.engine
+        start = time.perf_counter()
+        status = 200
+        try:
+            if path == "/health":
+                body = {"ok": True, "catalog": engine.catalog.count()}
+            elif path == "/metrics":
+                self._send(200, metrics.export().encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+                return
+            elif path == "/search":
+                query, n, local = _search_args(data)
+                if local:
+                    df, source = engine.search_local_first(query, n)
+                else:
+                    df, source = engine.search(query, n), "api"
+                body = {"results": df[["id", "title", "authors"]].astype(str).to_dict(orient="records")
+                        if not df.empty else [], "source": source}
+            elif path == "/recommend":
+                ids, top_k, mode, query, rerank = _recommend_args(data)
+                body = engine.recommend_for(ids, top_k, mode, query, rerank)
+            else:
+                status, body = 404, {"error": "not found"}
+        except BadRequest as exc:
+            status, body = 400, {"error": str(exc)}
+        except Exception:
+            logger.exception("Request to %s failed", path)
+            status, body = 500, {"error": "internal error"}
+        body["elapsed_ms"] = round((time.perf_counter() - start) * 1e3, 3)
+        metrics.counter("kitab_http_requests_total", "Engine HTTP requests by path and status",
+                        path=path if status != 404 else "other", status=status).inc()
+        self._send_json(status, body)
+
+    def _send_json(self, status, body):
+        self._send(status, json.dumps(body).encode("utf-8"), "application/json")
+
+    def _send(self, status, data, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug("%s " + format, self.address_string(), *args)
+
+
+def make_server(engine, host=HOST, port=PORT):
+    httpd = ThreadingHTTPServer((host, port), EngineHandler)
+    httpd.daemon_threads = True
+    httpd.engine = engine
+    return httpd
+
+
+def serve(engine, host=HOST, port=PORT, warm=True):
+    if warm:
+        # Fit the catalog model before accepting traffic so the first request is as fast as the rest
+        engine.warm()
+    httpd = make_server(engine, host, port)
+    logger.info("Serving recommendations on http://%s:%d", *httpd.server_address[:2])
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
@@ -0,0 +1,161 @@
+# Process-wide shared objects
+# Bounded LRU registry of read-only values shared across sessions, built once per key even under concurrency,
+# and a tally of what each session keeps for itself
+
+import sys
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+
+
+def estimate_size(value):
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(deep=True).sum())
+    if sp.issparse(value):
+        return int(value.data.nbytes + value.indices.nbytes + value.indptr.nbytes)
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    return sys.getsizeof(value)
+
+
+class SingleFlight:
+    def __init__(self):
+        self._calls = {}
+        self.coalesced = 0
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            future = self._calls.get(key)
+            owner = future is None
+            if owner:
+                future = self._calls[key] = Future()
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+        try:
+            result = fn()
+        except BaseException as exc:
+            future.set_exception(exc)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+class SharedRegistry:
+    def __init__(self, max_entries=128, max_bytes=256 * 1024 * 1024, ttl=None, sizeof=estimate_size):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.sizeof = sizeof
+        self.hits = 0
+        self.misses = 0
+        self.builds = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def _lookup(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, size, created = entry
+        if self.ttl is not None and time.time() - created > self.ttl:
+            del self._entries[key]
+            self._bytes -= size
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get_or_build(self, key, build, keep=None):
+        with self._lock:
+            entry = self._lookup(key)
+            if entry is not None:
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+
+        def build_and_store():
+            with self._lock:
+                entry = self._lookup(key)
+            if entry is not None:
+                return entry[0]
+            value = build()
+            self.builds += 1
+            if keep is None or keep(value):
+                self.put(key, value)
+            return value
+
+        return self._flight.do(key, build_and_store)
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size, time.time())
+            self._bytes += size
+            while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "builds": self.builds,
+                "evictions": self.evictions,
+            }
+
+
+class SessionMemory:
+    __slots__ = ("bytes", "__weakref__")
+
+    def __init__(self):
+        self.bytes = 0
+
+
+class SessionSizes:
+    # Each session keeps its SessionMemory in its own state; once the session is dropped the marker is collected
+    # and the session leaves the tally
+    def __init__(self, sizeof=estimate_size):
+        self.sizeof = sizeof
+        self._sessions = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def track(self):
+        memory = SessionMemory()
+        with self._lock:
+            self._sessions.add(memory)
+        return memory
+
+    def update(self, memory, values):
+        memory.bytes = sum(self.sizeof(value) for value in values if value is not memory)
+        return memory.bytes
+
+    def stats(self):
+        with self._lock:
+            sizes = [memory.bytes for memory in self._sessions]
+        return {"sessions": len(sizes), "bytes": sum(sizes), "max_bytes": max(sizes, default=0)}
@@ -0,0 +1,108 @@
+# Cosine similarity engine over a TF-IDF matrix or dense embeddings
+# Rows are L2-normalized once, so every query is a dot product (sparse, or batched BLAS for dense rows)
+# plus a top-k partition
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.preprocessing import normalize
+
+BATCH_SIZE = 256
+
+
+def normalize_dense(vectors):
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
+
+
+def _prepare(matrix):
+    if sp.issparse(matrix):
+        return normalize(sp.csr_matrix(matrix, dtype=np.float32), norm="l2", copy=True)
+    return normalize_dense(matrix)
+
+
+def top_k(scores, k):
+    k = min(k, scores.shape[1])
+    if k <= 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.int64), empty.astype(scores.dtype)
+    part = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part_scores = np.take_along_axis(scores, part, axis=1)
+    order = np.argsort(-part_scores, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(part_scores, order, axis=1)
+
+
+class SimilarityEngine:
+    def __init__(self, matrix):
+        self.matrix = _prepare(matrix)
+
+    @property
+    def size(self):
+        return self.matrix.shape[0]
+
+    @property
+    def dense(self):
+        return not sp.issparse(self.matrix)
+
+    def extend(self, matrix):
+        rows = _prepare(matrix)
+        if self.dense:
+            self.matrix = np.vstack([self.matrix, rows])
+        else:
+            self.matrix = sp.vstack([self.matrix, rows], format="csr")
+        return self
+
+    def scores(self, vectors):
+        result = vectors @ self.matrix.T
+        return np.asarray(result.toarray() if sp.issparse(result) else result, dtype=np.float32)
+
+    def query_vectors(self, vectors, k, exclude=None):
+        if not sp.issparse(vectors):
+            vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        all_idx, all_scores = [], []
+        for start in range(0, vectors.shape[0], BATCH_SIZE):
+            scores = self.scores(vectors[start:start + BATCH_SIZE])
+            if exclude is not None:
+                for r, cols in enumerate(exclude[start:start + BATCH_SIZE]):
+                    scores[r, cols] = -np.inf
+            idx, sc = top_k(scores, k)
+            all_idx.append(idx)
+            all_scores.append(sc)
+        if not all_idx:
+            return np.empty((0, 0), dtype=np.int64), np.empty((0, 0), dtype=np.float32)
+        return np.vstack(all_idx), np.vstack(all_scores)
+
+    def profile_scores(self, rows, weights=None, mode="centroid"):
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        weights = np.ones(len(rows), dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+        seeds = self.matrix[rows]
+        if mode == "centroid":
+            if self.dense:
+                profile = normalize_dense((seeds * weights[:, None]).sum(axis=0, keepdims=True))
+            else:
+                profile = normalize(sp.csr_matrix(seeds.multiply(weights[:, None]).sum(axis=0)), norm="l2")
+            return self.scores(profile)[0]
+        if mode == "max":
+            best = np.full(self.size, -np.inf, dtype=np.float32)
+            for start in range(0, len(rows), BATCH_SIZE):
+                sims = self.scores(seeds[start:start + BATCH_SIZE]) * weights[start:start + BATCH_SIZE, None]
+                np.maximum(best, sims.max(axis=0), out=best)
+            return best
+        raise ValueError(f"Unknown profile mode: {mode}")
+
+    def query_profile(self, rows, k, weights=None, mode="centroid"):
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        if len(rows) == 0:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        scores = self.profile_scores(rows, weights, mode)
+        seeds = np.unique(rows)
+        scores[seeds] = -np.inf
+        idx, sc = top_k(scores[None, :], min(k, self.size - len(seeds)))
+        return idx[0], sc[0]
+
+    def query(self, rows, k, exclude_self=True):
+        rows = np.atleast_1d(np.asarray(rows, dtype=np.int64))
+        exclude = [[r] for r in rows] if exclude_self else None
+        k = min(k, self.size - 1) if exclude_self else k
+        return self.query_vectors(self.matrix[rows], k, exclude=exclude)
@@ -0,0 +1,186 @@
+# Local thumbnail cache
+# Covers are downloaded once through a bounded worker pool, downscaled to the display width and stored
+# content-addressed on disk. Images and the per-URL refs pointing at them share one LRU size limit
+
+import base64
+import hashlib
+import io
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from kitab.shared import SingleFlight
+
+WIDTH = 140
+MAX_BYTES = 128 * 1024 * 1024
+WORKERS = 8
+TIMEOUT = 10
+FAILURE_TTL = 3600
+JPEG_QUALITY = 80
+FAILED = "!"
+
+
+def _sha256(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _size(st):
+    # Allocated size: a ref holds a few dozen bytes but occupies a whole filesystem block
+    return getattr(st, "st_blocks", 0) * 512 or st.st_size
+
+
+def _disk_bytes(path):
+    try:
+        return _size(os.stat(path))
+    except OSError:
+        return 0
+
+
+class ThumbnailCache:
+    def __init__(self, root, width=WIDTH, max_bytes=MAX_BYTES, workers=WORKERS, session=None, timeout=TIMEOUT):
+        self.root = root
+        self.width = width
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        self.evictions = 0
+        self._session = session
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kitab-thumbs")
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        os.makedirs(os.path.join(root, "refs"), exist_ok=True)
+        self._bytes = sum(_size(entry.stat()) for entry in self._files())
+        self.placeholder = self._make_placeholder()
+
+    def _files(self):
+        for kind in ("objects", "refs"):
+            for shard in os.scandir(os.path.join(self.root, kind)):
+                if shard.is_dir():
+                    yield from os.scandir(shard.path)
+
+    def _ref_path(self, url):
+        digest = _sha256(url.encode("utf-8"))
+        return os.path.join(self.root, "refs", digest[:2], digest)
+
+    def _object_path(self, digest):
+        return os.path.join(self.root, "objects", digest[:2], digest + ".jpg")
+
+    def _make_placeholder(self):
+        out = io.BytesIO()
+        Image.new("RGB", (self.width, int(self.width * 10 / 7)), (51, 51, 51)).save(out, "JPEG")
+        return out.getvalue()
+
+    def _write(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        old = _disk_bytes(path)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+        with self._lock:
+            self._bytes += _disk_bytes(path) - old
+
+    def cached(self, url):
+        ref_path = self._ref_path(url)
+        try:
+            with open(ref_path) as fh:
+                ref = fh.read().strip()
+            os.utime(ref_path)
+        except OSError:
+            return None
+        if ref.startswith(FAILED):
+            failed_at = float(ref[1:] or 0)
+            return self.placeholder if time.time() - failed_at < FAILURE_TTL else None
+        path = self._object_path(ref)
+        try:
+            with open(path, "rb") as fh:
+                data = fh.read()
+            os.utime(path)
+        except OSError:
+            return None
+        return data
+
+    def _download(self, url):
+        session = self._session
+        if session is None:
+            import requests
+            session = requests
+        try:
+            res = session.get(url, timeout=self.timeout)
+            res.raise_for_status()
+            image = Image.open(io.BytesIO(res.content))
+            image.thumbnail((self.width, self.width * 3))
+            out = io.BytesIO()
+            image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+            data = out.getvalue()
+        except Exception:
+            self.failures += 1
+            self._write(self._ref_path(url), f"{FAILED}{time.time()}".encode())
+            return self.placeholder
+
+        digest = _sha256(data)
+        path = self._object_path(digest)
+        if not os.path.exists(path):
+            self._write(path, data)
+        self._write(self._ref_path(url), digest.encode())
+        if self._bytes > self.max_bytes:
+            self._evict()
+        return data
+
+    def _evict(self):
+        # Oldest first across images and refs: a ref left without its image, or an image nothing refers to any
+        # more, just means one more download
+        with self._lock:
+            entries = sorted((entry.stat().st_mtime, entry.path, _size(entry.stat())) for entry in self._files())
+            target = int(self.max_bytes * 0.9)
+            for _, path, size in entries:
+                if self._bytes <= target:
+                    break
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                self._bytes -= size
+                self.evictions += 1
+
+    def get(self, url):
+        if not url:
+            return self.placeholder
+        data = self.cached(url)
+        if data is not None:
+            self.hits += 1
+            return data
+        self.misses += 1
+        return self._flight.do(url, lambda: self._download(url))
+
+    def prefetch(self, urls):
+        return {url: self._pool.submit(self.get, url) for url in set(urls) if url}
+
+    def data_uris(self, urls):
+        # Never waits on the network: covers already on disk are inlined, the others map to None (the card keeps
+        # the remote URL) while the pool fetches them for the next render
+        uris = []
+        pending = set()
+        for url in urls:
+            if not isinstance(url, str) or not url:
+                uris.append("")
+                continue
+            data = self.cached(url)
+            if data is None:
+                pending.add(url)
+                uris.append(None)
+            else:
+                self.hits += 1
+                uris.append("data:image/jpeg;base64," + base64.b64encode(data).decode("ascii"))
+        self.prefetch(pending)
+        return uris
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "failures": self.failures,
+                "evictions": self.evictions, "bytes": self._bytes}
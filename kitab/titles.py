@@ -0,0 +1,90 @@
+# Title resolution
+# Character trigram inverted index for ranked fuzzy title matches
+
+import re
+import sys
+
+import numpy as np
+
+from kitab import metrics
+
+_NON_WORD = re.compile(r"[^\w]+")
+RARE_POSTING_MIN = 1000
+RARE_POSTING_FRACTION = 0.02
+CANDIDATES_PER_RESULT = 4
+
+
+def normalize_title(title):
+    return _NON_WORD.sub(" ", str(title).lower()).strip()
+
+
+def trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TitleIndex:
+    def __init__(self, ids=(), titles=()):
+        self.ids = []
+        self._normalized = []
+        self._postings = {}
+        self._frozen = {}
+        self.add(ids, titles)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, ids, titles):
+        for vid, title in zip(ids, titles):
+            row = len(self.ids)
+            norm = normalize_title(title)
+            grams = trigrams(norm)
+            self.ids.append(vid)
+            self._normalized.append(norm)
+            for gram in grams:
+                self._postings.setdefault(gram, []).append(row)
+                self._frozen.pop(gram, None)
+        return self
+
+    def __sizeof__(self):
+        # Strings plus one list slot per posting; frozen arrays are rebuilt on demand and not counted
+        postings = sum(len(rows) for rows in self._postings.values())
+        strings = sum(sys.getsizeof(s) for s in self._normalized)
+        return object.__sizeof__(self) + strings + 8 * (postings + 2 * len(self.ids)) + sys.getsizeof(self._postings)
+
+    def _posting(self, gram):
+        arr = self._frozen.get(gram)
+        if arr is None:
+            arr = self._frozen[gram] = np.asarray(self._postings[gram], dtype=np.int32)
+        return arr
+
+    @metrics.stage("match")
+    def search(self, query, n=5, cutoff=0.4):
+        norm = normalize_title(query)
+        grams = trigrams(norm)
+        postings = sorted((self._posting(g) for g in grams if g in self._postings), key=len)
+        if not postings:
+            return []
+
+        # Candidates come from the rarer grams only; grams shared by a large slice of the catalog add
+        # little ranking signal but dominate the cost of the postings merge
+        limit = max(RARE_POSTING_MIN, int(RARE_POSTING_FRACTION * len(self.ids)))
+        rare = [p for p in postings if len(p) <= limit] or postings[:1]
+        cand, shared = np.unique(np.concatenate(rare), return_counts=True)
+        width = max(n * CANDIDATES_PER_RESULT, 20)
+        if len(cand) > width:
+            cand = cand[np.argpartition(-shared, width - 1)[:width]]
+
+        # Dice coefficient over the full trigram sets of the surviving candidates
+        results = []
+        for row in cand:
+            other = trigrams(self._normalized[row])
+            score = 2.0 * len(grams & other) / (len(grams) + len(other))
+            if score >= cutoff:
+                results.append((int(row), score))
+        results.sort(key=lambda r: (-r[1], r[0]))
+        return results[:n]
+
+    def best_match(self, query, cutoff=0.4):
+        matches = self.search(query, n=1, cutoff=cutoff)
+        return matches[0][0] if matches else None
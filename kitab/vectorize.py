@@ -0,0 +1,325 @@
+# TF-IDF vectorization with a corpus-keyed model cache
+# Unchanged corpora reuse the fitted matrix; a few new books are transformed and appended.
+# The "lsa" mode projects TF-IDF onto a truncated SVD basis and keeps contiguous float32 vectors instead.
+# lsa and hashing models can be saved and reloaded; tfidf models are cheap enough to refit
+
+import copy
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import HashingVectorizer, TfidfTransformer, TfidfVectorizer
+
+from kitab import metrics
+from kitab.shared import SingleFlight, estimate_size
+from kitab.similarity import SimilarityEngine, normalize_dense
+
+STOP_WORDS = "english"
+MAX_FEATURES = 5000
+HASHING_FEATURES = 2 ** 18
+REFIT_FRACTION = 0.2
+MAX_MODEL_BYTES = 512 * 1024 * 1024
+LSA_DIM = 192
+MODES = ("tfidf", "hashing", "lsa")
+SAVED_MODES = ("hashing", "lsa")
+
+
+def _text_column(col):
+    # Categorical columns cannot be filled with a value outside their categories
+    return col.astype(object).fillna("").astype(str)
+
+
+def build_text(df):
+    return (
+            _text_column(df["title"]) + " " +
+            _text_column(df["authors"]) + " " +
+            _text_column(df["description"]) + " " +
+            _text_column(df["categories"])
+    )
+
+
+def corpus_key(ids):
+    digest = hashlib.blake2b(digest_size=16)
+    for vid in sorted(ids):
+        digest.update(vid.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def hashing_vectorizer():
+    return HashingVectorizer(stop_words=STOP_WORDS, n_features=HASHING_FEATURES, alternate_sign=False, norm=None)
+
+
+def _vocabulary_key(vectorizer):
+    vocabulary = "\0".join(vectorizer.get_feature_names_out()).encode("utf-8")
+    return hashlib.blake2b(vocabulary, digest_size=16).hexdigest()
+
+
+class TfidfModel:
+    def __init__(self, mode="tfidf", refit_fraction=REFIT_FRACTION, dim=LSA_DIM):
+        if mode not in MODES:
+            raise ValueError(f"Unknown vectorizer mode: {mode}")
+        self.mode = mode
+        self.refit_fraction = refit_fraction
+        self.dim = dim
+        self.components = None
+        self.ids = []
+        self.pos = {}
+        self.matrix = None
+        self.vectorizer = None
+        self.counts = None
+        self.transformer = None
+        self.fitted_size = 0
+        self.appended = 0
+        self.version = 0
+        self.feature_key = None
+        self.engine = None
+        self.ann = None
+        self._lock = threading.Lock()
+
+    @metrics.stage("vectorize")
+    def fit(self, ids, texts):
+        if self.mode == "tfidf":
+            self.vectorizer = TfidfVectorizer(stop_words=STOP_WORDS, max_features=MAX_FEATURES)
+            self.matrix = self.vectorizer.fit_transform(texts)
+            self.feature_key = "tfidf:" + _vocabulary_key(self.vectorizer)
+        elif self.mode == "lsa":
+            self.vectorizer = TfidfVectorizer(stop_words=STOP_WORDS, max_features=MAX_FEATURES)
+            tfidf = self.vectorizer.fit_transform(texts)
+            dim = max(1, min(self.dim, tfidf.shape[0] - 1, tfidf.shape[1] - 1))
+            svd = TruncatedSVD(n_components=dim, algorithm="randomized", random_state=0)
+            self.matrix = normalize_dense(svd.fit_transform(tfidf))
+            self.components = np.ascontiguousarray(svd.components_, dtype=np.float32)
+            self.feature_key = f"lsa{dim}:" + _vocabulary_key(self.vectorizer)
+        else:
+            self.vectorizer = hashing_vectorizer()
+            self._fit_counts(self.vectorizer.transform(texts).tocsr())
+        self.ids = list(ids)
+        self.pos = {vid: i for i, vid in enumerate(self.ids)}
+        self.fitted_size = len(self.ids)
+        self.appended = 0
+        self.engine = None
+        self.ann = None
+        self.version += 1
+        return self
+
+    def _fit_counts(self, counts):
+        self.counts = counts
+        self.transformer = TfidfTransformer().fit(self.counts)
+        self.matrix = self.transformer.transform(self.counts)
+        self.feature_key = f"hashing:{HASHING_FEATURES}"
+
+    @classmethod
+    def from_counts(cls, ids, counts, refit_fraction=REFIT_FRACTION):
+        # Hashing counts are stateless per document, so they can be computed elsewhere (e.g. by bulk import
+        # workers) and only the IDF weighting is fitted here
+        model = cls("hashing", refit_fraction)
+        model.vectorizer = hashing_vectorizer()
+        model._fit_counts(sp.csr_matrix(counts))
+        model.ids = list(ids)
+        model.pos = {vid: i for i, vid in enumerate(model.ids)}
+        model.fitted_size = len(model.ids)
+        model.version = 1
+        return model
+
+    def transform(self, texts):
+        if self.mode == "tfidf":
+            return self.vectorizer.transform(texts)
+        if self.mode == "lsa":
+            return normalize_dense(self.vectorizer.transform(texts) @ self.components.T)
+        return self.transformer.transform(self.vectorizer.transform(texts))
+
+    @metrics.stage("vectorize")
+    def extend(self, ids, texts):
+        ids = list(ids)
+        if not ids:
+            return self
+        self.appended += len(ids)
+        if self.mode in ("tfidf", "lsa"):
+            new_rows = self.transform(texts)
+            if self.mode == "lsa":
+                self.matrix = np.vstack([self.matrix, new_rows])
+            else:
+                self.matrix = sp.vstack([self.matrix, new_rows], format="csr")
+            if self.engine is not None:
+                self.engine.extend(new_rows)
+        else:
+            self.counts = sp.vstack([self.counts, self.vectorizer.transform(texts)], format="csr")
+            if self.appended > self.refit_fraction * self.fitted_size:
+                # Hashing features are stateless, so an IDF refresh only re-weights the stored counts
+                self.transformer = TfidfTransformer().fit(self.counts)
+                self.matrix = self.transformer.transform(self.counts)
+                self.fitted_size = self.counts.shape[0]
+                self.appended = 0
+                self.engine = None
+            else:
+                new_rows = self.transformer.transform(self.counts[-len(ids):])
+                self.matrix = sp.vstack([self.matrix, new_rows], format="csr")
+                if self.engine is not None:
+                    self.engine.extend(new_rows)
+        if self.ann is not None:
+            # Projections are approximate anyway, so an IDF refresh does not invalidate the index
+            self.ann.add(self.matrix[-len(ids):], ids)
+        for vid in ids:
+            self.pos[vid] = len(self.ids)
+            self.ids.append(vid)
+        self.version += 1
+        return self
+
+    def can_extend(self, n_new):
+        # Appending keeps the fitted vocabulary, so a growing corpus is refit once it drifts too far
+        return self.mode == "hashing" or n_new <= self.refit_fraction * self.fitted_size - self.appended
+
+    def extended(self, ids, texts):
+        # Cached models are shared read-only across sessions, so growth happens on a copy, ANN index included
+        clone = copy.copy(self)
+        clone.ids = list(self.ids)
+        clone.pos = dict(self.pos)
+        clone.engine = copy.copy(self.engine)
+        clone.ann = self.ann.copy() if self.ann is not None else None
+        clone._lock = threading.Lock()
+        return clone.extend(ids, texts)
+
+    def nbytes(self):
+        arrays = [self.matrix, self.counts, self.components]
+        engine = self.engine
+        if engine is not None and engine.matrix is not self.matrix:
+            arrays.append(engine.matrix)
+        return sum(estimate_size(a) for a in arrays if a is not None)
+
+    def similarity(self):
+        with self._lock:
+            if self.engine is None:
+                with metrics.stage("index"):
+                    self.engine = SimilarityEngine(self.matrix)
+            return self.engine
+
+    def save(self, path):
+        # lsa keeps the projection, the vocabulary it reads and the stored vectors; hashing keeps the raw counts
+        if self.mode not in SAVED_MODES:
+            raise ValueError(f"{self.mode} models cannot be saved")
+        if self.mode == "lsa":
+            arrays = {"matrix": self.matrix, "components": self.components, "idf": self.vectorizer.idf_,
+                      "vocabulary": self.vectorizer.get_feature_names_out().astype(str)}
+        else:
+            arrays = {"counts_data": self.counts.data, "counts_indices": self.counts.indices,
+                      "counts_indptr": self.counts.indptr, "counts_shape": np.asarray(self.counts.shape)}
+        tmp = path + ".tmp.npz"
+        np.savez(tmp, mode=np.asarray(self.mode), ids=np.asarray(self.ids, dtype=str),
+                 state=np.asarray([self.fitted_size, self.appended, self.dim]),
+                 feature_key=np.asarray(self.feature_key), refit_fraction=np.asarray(self.refit_fraction), **arrays)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            if str(data["mode"]) == "hashing":
+                counts = sp.csr_matrix((data["counts_data"], data["counts_indices"], data["counts_indptr"]),
+                                       shape=tuple(data["counts_shape"]))
+                return cls.from_counts(data["ids"].tolist(), counts, float(data["refit_fraction"]))
+            fitted_size, appended, dim = (int(v) for v in data["state"])
+            model = cls("lsa", float(data["refit_fraction"]), dim)
+            model.vectorizer = TfidfVectorizer(stop_words=STOP_WORDS, max_features=MAX_FEATURES,
+                                               vocabulary={term: i for i, term in enumerate(data["vocabulary"])})
+            model.vectorizer.idf_ = data["idf"]
+            model.components = data["components"]
+            model.matrix = np.ascontiguousarray(data["matrix"])
+            model.ids = data["ids"].tolist()
+            model.feature_key = str(data["feature_key"])
+        model.pos = {vid: i for i, vid in enumerate(model.ids)}
+        model.fitted_size = fitted_size
+        model.appended = appended
+        model.version = 1
+        return model
+
+
+class VectorizerCache:
+    def __init__(self, mode="tfidf", max_models=4, refit_fraction=REFIT_FRACTION, dim=LSA_DIM,
+                 max_bytes=MAX_MODEL_BYTES):
+        self.mode = mode
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self.refit_fraction = refit_fraction
+        self.dim = dim
+        self.hits = 0
+        self.extends = 0
+        self.fits = 0
+        self._models = OrderedDict()
+        self._lock = threading.Lock()
+        self._flight = SingleFlight()
+
+    def model_for(self, ids, texts):
+        ids = list(ids)
+        key = corpus_key(ids)
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                self._models.move_to_end(key)
+                self.hits += 1
+                return model
+        # Concurrent first requests for the same corpus share one fit
+        return self._flight.do(key, lambda: self._build(key, ids, texts))
+
+    def _build(self, key, ids, texts):
+        with self._lock:
+            model = self._models.get(key)
+            if model is not None:
+                return model
+            wanted = set(ids)
+            base, base_key = None, None
+            for cand_key, cand in self._models.items():
+                if len(cand.ids) < len(ids) and wanted.issuperset(cand.pos) and (
+                        base is None or len(cand.ids) > len(base.ids)):
+                    base, base_key = cand, cand_key
+
+        new_ids = [vid for vid in ids if base is None or vid not in base.pos]
+        if base is not None and base.can_extend(len(new_ids)):
+            model = base.extended(new_ids, texts(new_ids))
+            self.extends += 1
+        else:
+            model = TfidfModel(self.mode, self.refit_fraction, self.dim).fit(ids, texts(ids))
+            self.fits += 1
+
+        with self._lock:
+            # A corpus that grew out of a cached one supersedes it: a growing catalog would otherwise keep one
+            # full copy of its matrix per step
+            if base_key is not None:
+                self._models.pop(base_key, None)
+            self._models[key] = model
+            self._evict()
+        return model
+
+    def _evict(self):
+        # Bounded by count and by bytes; the newest model always stays
+        while len(self._models) > 1 and (len(self._models) > self.max_models or self._bytes() > self.max_bytes):
+            self._models.popitem(last=False)
+
+    def _bytes(self):
+        return sum(model.nbytes() for model in self._models.values())
+
+    def adopt(self, model):
+        # Seeds the cache with a model loaded from disk, so later corpora extend it instead of refitting
+        with self._lock:
+            self._models[corpus_key(model.ids)] = model
+            self._evict()
+
+    def model_for_frame(self, df):
+        ids = df["id"].astype(str).tolist()
+        if len(set(ids)) != len(ids):
+            return TfidfModel(self.mode, self.refit_fraction, self.dim).fit(ids, build_text(df))
+
+        def texts(wanted):
+            by_id = dict(zip(ids, build_text(df)))
+            return [by_id[vid] for vid in wanted]
+
+        return self.model_for(ids, texts)
+
+    def stats(self):
+        with self._lock:
+            size = self._bytes()
+        return {"hits": self.hits, "misses": self.extends + self.fits, "extends": self.extends, "fits": self.fits,
+                "models": len(self._models), "bytes": size}